@@ -5,14 +5,20 @@
     Desc     : 语雀备份脚本-入口
 -------------------------------------------------
 """
-from yuque_doc_backups import init_token, fetch_user_id, fetch_repo_list, fetch_toc_list, doc_count
-from yeque_md_to_local import new_md_to_local, search_all_file, md_to_local, pic_url_path_record_list, download_pic
+import yuque_doc_backups
+from yuque_doc_backups import init_token, fetch_user_id, fetch_repo_list, fetch_toc_list, backups_origin_md_dir
+from yeque_md_to_local import new_md_to_local, iter_all_file, download_pic, localize_and_save, \
+    localize_md_content, PicDownloadQueue
+from yuque_archive import BackupArchive
 import asyncio
+import os
 import time
 
 # 备份分为两个阶段
 # 第一阶段下载的文档内图片是未修改的(远程url)----这个文档在第二阶段可以重复使用(只要下载后远程文档未修改)
 # 第二阶段是根据下载的文档进行备份并下载图片到本地,两种方式
+# 单次写入模式(2)把两个阶段合并: 文档下载后直接在内存中本地化并写入local_md,图片边备份边下载,不生成origin_md
+# 归档模式(3)与单次写入相同,但文档和图片直接写入backups下的单个zip/tar.zst文件,附带 doc_id → 路径/更新时间/哈希 的索引
 if __name__ == '__main__':
     yq_token = input("请输入你的语雀Token:")
     if len(yq_token) == 0:
@@ -20,8 +26,57 @@ if __name__ == '__main__':
     init_token(yq_token)
     start_time = time.time()
     
-    img_params = input("是否同步图片数据到本地(0:文件备份,1:文件备份+本地化):")
-    if img_params == '0' or img_params == '1':
+    img_params = input("是否同步图片数据到本地(0:文件备份,1:文件备份+本地化,2:备份时直接本地化(单次写入),3:备份到单文件归档):")
+    if img_params == '2':
+        yq_user_id = fetch_user_id()
+        print("开始执行文档备份及本地化，请稍等...")
+        yq_repo_list = fetch_repo_list(yq_user_id)
+        pic_queue = PicDownloadQueue()
+
+        # 保存路径相对origin_md的部分决定local_md中的位置,与两阶段模式一致
+        def localize_doc(content, save_path, doc):
+            md_relative_path = os.path.relpath(save_path, backups_origin_md_dir)
+            localize_and_save(content, md_relative_path, False, pic_queue)
+
+        for yq_repo in yq_repo_list:
+            print("开始拉取【{}】仓库下的文档".format(yq_repo.repo_name))
+            fetch_toc_list(yq_repo.repo_id, yq_repo.repo_name, localize_doc)
+        print("文档备份及本地化完毕，共记【{}】篇,等待图片下载完成...".format(yuque_doc_backups.doc_count))
+        pic_count = pic_queue.join()
+        print("语雀文档备份及Markdown本地化已执行完毕,共下载图片【{}】张,共计耗时：{:.2f}ms, 快去打开文件看看吧😄~".format(
+            pic_count, (time.time() - start_time) * 1000))
+    elif img_params == '3':
+        archive_format = input("归档格式(zip/tar.zst,默认zip):") or "zip"
+        archive_path = os.path.join(yuque_doc_backups.backups_base_dir, "yuque_backup.{}".format(archive_format))
+        yuque_doc_backups.is_dir_existed(yuque_doc_backups.backups_base_dir)
+        # 出现异常时删除临时文件，上一次的归档保持不变
+        with BackupArchive(archive_path, archive_format) as archive:
+            yq_user_id = fetch_user_id()
+            print("开始执行文档归档，请稍等...")
+            yq_repo_list = fetch_repo_list(yq_user_id)
+            pic_queue = PicDownloadQueue(sink=archive.add_file)
+
+            # 归档内路径与local_md的目录结构一致: 知识库/目录/文档/文档.md,图片在文档目录下的images内
+            def archive_doc(content, save_path, doc):
+                md_relative_path = os.path.relpath(save_path, backups_origin_md_dir).replace(os.sep, "/")
+                member_dir = md_relative_path[:-3]
+                new_content, pic_records = localize_md_content(content, member_dir + "/images")
+                archive.add_doc(doc.get('id'), "{}/{}".format(member_dir, md_relative_path.split("/")[-1]),
+                                new_content + "\n", doc.get('updated_at'), doc.get('title'))
+                for pic_url, pic_member in pic_records:
+                    pic_member = pic_member.replace(os.sep, "/")
+                    if not archive.reuse_file(pic_member):
+                        pic_queue.put(pic_url, pic_member)
+
+            for yq_repo in yq_repo_list:
+                print("开始拉取【{}】仓库下的文档".format(yq_repo.repo_name))
+                fetch_toc_list(yq_repo.repo_id, yq_repo.repo_name, archive_doc)
+            pic_count = pic_queue.join()
+            changes = archive.close()
+        print("归档完成：{}，共记文档【{}】篇(新增{},修改{},删除{}),新下载图片【{}】张,共计耗时：{:.2f}ms".format(
+            archive_path, yuque_doc_backups.doc_count, len(changes['added']), len(changes['modified']),
+            len(changes['deleted']), pic_count, (time.time() - start_time) * 1000))
+    elif img_params == '0' or img_params == '1':
         
         # 第一阶段----下载文档(注意:如果有子文档,那么当前文档会是文件夹名(意味着丢失当前文档内容))
         # 如果远程已经下载并且未改变,那么可以注释以下
@@ -36,20 +91,21 @@ if __name__ == '__main__':
             #     continue
             print("开始拉取【{}】仓库下的文档".format(yq_repo.repo_name))
             fetch_toc_list(yq_repo.repo_id, yq_repo.repo_name)
-        print("文档备份完毕，共记备份文档【{}】篇,共计耗时：{:.2f}ms,开始执行Markdown文件批量本地化...".format(doc_count,(time.time() - start_time) * 1000))
+        print("文档备份完毕，共记备份文档【{}】篇,共计耗时：{:.2f}ms,开始执行Markdown文件批量本地化...".format(yuque_doc_backups.doc_count,(time.time() - start_time) * 1000))
 
         if img_params == '1':
             # 第二阶段
-            yq_doc_file_list = search_all_file()
-            print("共扫描到Markdown文件【{}】篇，开始批量本地化...".format(len(yq_doc_file_list)))
+            # 边扫描边本地化，不需要先收集完整的文件列表
+            yq_doc_file_iter = iter_all_file()
 
             # 第二个参数:True表示所有文档放一个文件夹,所有图片放一个文件夹,False表示图片随文档放入文件夹
-            # md_to_local(yq_doc_file_list)
-            new_md_to_local(yq_doc_file_list,False)
+            # md_to_local(search_all_file())
+            local_results = new_md_to_local(yq_doc_file_iter,False)
+            print("共本地化Markdown文件【{}】篇...".format(len(local_results)))
             loop = asyncio.get_event_loop()
-            for pic_url_path_record in pic_url_path_record_list:
-                split_list = pic_url_path_record.split("\t")
-                loop.run_until_complete(download_pic(split_list[1], split_list[0]))
+            for new_md_file_path, pic_records in local_results:
+                for pic_url, pic_path in pic_records:
+                    loop.run_until_complete(download_pic(pic_path, pic_url))
             print("语雀文档备份及Markdown本地化已执行完毕,共计耗时：{:.2f}ms, 快去打开文件看看吧😄~".format(
                 (time.time() - start_time) * 1000))
     else:
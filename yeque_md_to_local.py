@@ -8,9 +8,14 @@
    Desc     : 语雀md文件本地化
 -------------------------------------------------
 """
+import asyncio
+import hashlib
 import os
 import re
-import time
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
 from functools import partial
 
 import aiofiles
@@ -26,28 +31,51 @@ default_headers = {
                   'Chrome/85.0.4183.121 Safari/537.36 ',
 }
 pic_match_pattern = re.compile(r'(!\[.*?\]\()(.*?)(\.(png|PNG|jpg|JPG|jepg|gif|GIF|svg|SVG|webp|awebp))(.*?)\)', re.M)
-pic_url_path_record_list = []
-order_set = {i for i in range(1, 500000)}  # 避免图片名重复后缀
+
+
+# 判断文件(夹)是否匹配任意一个通配符，同时匹配文件名和相对路径
+def match_any_pattern(name, relative_path, patterns):
+    return any(fnmatch(name, pattern) or fnmatch(relative_path, pattern) for pattern in patterns)
+
+
+# 遍历文件夹与子文件夹中的特定后缀文件(生成器，不切换工作目录，边遍历边返回)
+def iter_all_file(file_dir=backups_origin_md_dir, target_suffix_tuple=('.md',), include=None, exclude=None):
+    """
+    include/exclude 为通配符列表，匹配文件名或相对 file_dir 的路径(以/分隔)，
+    例如 exclude=['*.tmp.md', 'drafts']；被 exclude 命中的文件夹不会再往下遍历
+    """
+    if isinstance(target_suffix_tuple, str):
+        target_suffix_tuple = (target_suffix_tuple,)
+    stack = [(file_dir, '')]
+    while stack:
+        current_dir, relative_dir = stack.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as reason:
+            print(str(reason))
+            continue
+        sub_dirs = []
+        for entry in entries:
+            relative_path = relative_dir + entry.name
+            if exclude and match_any_pattern(entry.name, relative_path, exclude):
+                continue
+            # DirEntry 缓存了文件类型，不需要额外的stat调用
+            if entry.is_dir():
+                sub_dirs.append((entry.path, relative_path + '/'))
+            elif target_suffix_tuple is not None and not entry.name.endswith(target_suffix_tuple):
+                continue
+            elif include and not match_any_pattern(entry.name, relative_path, include):
+                continue
+            else:
+                yield entry.path
+        # 逆序入栈，保证按文件名顺序遍历子文件夹
+        stack.extend(reversed(sub_dirs))
 
 
 # 递归遍历文夹与子文件夹中的特定后缀文件
-def search_all_file(file_dir=backups_origin_md_dir, target_suffix_tuple=('.md')):
-    file_list = []
-    # 切换到目录下
-    os.chdir(file_dir)
-    file_name_list = os.listdir(os.curdir)
-    for file_name in file_name_list:
-        # 获取文件绝对路径
-        file_path = "{}{}{}".format(os.getcwd(), os.path.sep, file_name)
-        # 判断是否为目录，是往下递归
-        if os.path.isdir(file_path):
-            file_list.extend(search_all_file(file_path, target_suffix_tuple))
-            os.chdir(os.pardir)
-        elif target_suffix_tuple is not None and file_name.endswith(target_suffix_tuple):
-            file_list.append(file_path)
-        else:
-            pass
-    return file_list
+def search_all_file(file_dir=backups_origin_md_dir, target_suffix_tuple=('.md',), include=None, exclude=None):
+    return list(iter_all_file(file_dir, target_suffix_tuple, include, exclude))
 
 
 # 异步下载图片
@@ -74,6 +102,61 @@ async def download_pic(pic_path, url, headers=None):
         print("下载异常：{}\n{}".format(url, e))
 
 
+# 异步下载图片内容，失败返回None
+async def download_pic_bytes(url, headers=None):
+    try:
+        resp = await requests.get(url, headers=headers or default_headers)
+        print("下载图片：%s" % url)
+        if resp is not None and resp.status == 200:
+            return await resp.read()
+        print("图片不存在：{}".format(url))
+    except Exception as e:
+        print("下载异常：{}\n{}".format(url, e))
+    return None
+
+
+# 图片下载队列: 在后台线程的事件循环中并发下载，放入队列后立即返回
+# sink(图片路径, 图片内容)不为空时图片交给它保存(例如写入归档)，不再写入本地文件
+class PicDownloadQueue:
+    def __init__(self, concurrency=8, headers=None, sink=None):
+        self.concurrency = concurrency
+        self.headers = headers
+        self.sink = sink
+        self.semaphore = None
+        self.futures = []
+        self.queued_paths = set()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    # 加入下载队列，同一路径只下载一次
+    def put(self, pic_url, pic_path):
+        if pic_path in self.queued_paths:
+            return
+        self.queued_paths.add(pic_path)
+        self.futures.append(asyncio.run_coroutine_threadsafe(self._download(pic_path, pic_url), self.loop))
+
+    async def _download(self, pic_path, pic_url):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        async with self.semaphore:
+            if self.sink is None:
+                await download_pic(pic_path, pic_url, self.headers)
+                return
+            data = await download_pic_bytes(pic_url, self.headers)
+            if data is not None:
+                self.sink(pic_path, data)
+
+    # 等待所有图片下载完毕并关闭事件循环
+    def join(self):
+        for future in self.futures:
+            future.result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        return len(self.queued_paths)
+
+
 # 以文本形式读取文件
 def read_file_text_content(file_path):
     if not os.path.exists(file_path):
@@ -96,96 +179,111 @@ def write_text_to_file(content, file_path, mode="w+"):
 # 判断目录是否存在，不存在新建
 def is_dir_existed(file_path, mkdir=True):
     if mkdir:
-        if not os.path.exists(file_path):
-            os.makedirs(file_path)
+        # 多个进程可能同时创建同一目录
+        os.makedirs(file_path, exist_ok=True)
     else:
         return os.path.exists(file_path)
 
 
-#远程图片转换为本地图片
-def pic_to_local(match_result, pic_save_dir):
-    global pic_url_path_record_list
+# 远程图片转换为本地图片，(图片URL, 本地绝对路径)记录到pic_records中，后续异步下载
+def pic_to_local(match_result, pic_save_dir, pic_records):
     pic_url = match_result[2] + match_result[3] + match_result[5]
-    print("替换前的图片路径：{}".format(pic_url))
-    # 生成新的图片名
-    img_file_name = "{}_{}.{}".format(int(round(time.time())), order_set.pop(), match_result[4])
+    # 根据图片URL生成固定的图片名，重复本地化时结果不变
+    img_file_name = "{}.{}".format(hashlib.md5(pic_url.encode('utf-8')).hexdigest()[:16], match_result[4])
     # 拼接图片相对路径(Markdown用到的)
     relative_path = local_pic_path.format(img_file_name)
-    print("替换后Markdown显示的相对路径：{}".format(relative_path))
-    # 拼接图片绝对路径，下载到本地
+    # 拼接图片绝对路径，下载到本地----F:\blog\YuQueBackups\backups\local_pic\3f2a9c0d5e7b1a46.png
     absolute_path = os.path.join(pic_save_dir, img_file_name)
-    print("替换后的图片路径：{}".format(relative_path))
-
-    # 放入数组,后续异步下载----F:\blog\YuQueBackups\backups\local_pic1/1708224449_4.png
-    pic_url_path_record_list.append("{}\t{}".format(pic_url, absolute_path))
+    pic_records.append((pic_url, absolute_path))
     # 拼接前后括号()
     return "{}{}{}".format(match_result[1], relative_path, ")")
 
 
-# md文件本地化
-def md_to_local(md_file_list):
-    # 遍历backups/origin_md目录下所有md文件
-    for md_file_path in md_file_list:
-        # 读取md文件内容
-        old_content = read_file_text_content(md_file_path)
-        # 定位oring_md所在的下标，拼接新生成的md文件的目录要用到
-        absolute_dir_index = md_file_path.find("origin_md")
-        # 新md文件的相对路径
-        md_relative_path = md_file_path[absolute_dir_index + 10:]
-        # 新md文件所在目录
+# 替换md内容中的远程图片，返回(新内容, 图片记录列表)
+def localize_md_content(content, pic_save_dir):
+    pic_records = []
+    new_content = pic_match_pattern.sub(partial(pic_to_local, pic_save_dir=pic_save_dir, pic_records=pic_records),
+                                        content)
+    return new_content, pic_records
+
+
+# 计算本地化后的md文件目录、md文件路径和图片目录
+def local_md_paths(md_relative_path, is_one_path):
+    md_file_name = os.path.basename(md_relative_path)
+    # 方式一:所有文档到一个文件夹--对应hexo博客
+    if is_one_path:
+        # 新md文件所在目录---F:\blog\YuQueBackups\backups\local_md
+        new_md_dir = backups_local_md_dir
+        # 图片的保存路径---F:\blog\YuQueBackups\backups\local_pic
+        new_picture_dir = backups_local_pic_dir
+    # 方式二:根据文档所处的知识库进行划分,每个文档有各自的图片管理文件夹(图片文档所处文件夹下的images内)
+    else:
+        # 新md文件所在目录---F:\blog\YuQueBackups\backups\local_md\Go\go-demo
         new_md_dir = os.path.join(backups_local_md_dir, md_relative_path[:-3])
-        # 新md文件的完整路径
-        new_md_file_path = os.path.join(new_md_dir, os.path.basename(md_file_path))
-        # 图片的保存路径
+        # 图片的保存路径---F:\blog\YuQueBackups\backups\local_md\Go\go-demo\images
         new_picture_dir = os.path.join(new_md_dir, "images")
-        # 路径不存在新建
-        is_dir_existed(new_md_dir)
-        is_dir_existed(new_picture_dir)
-        # 替换后的md文件内容
-        new_content = pic_match_pattern.sub(partial(pic_to_local, pic_save_dir=new_picture_dir), old_content)
-        # 生成新的md文件
-        write_text_to_file(new_content, new_md_file_path)
-        print("新md文件已生成 → {}".format(new_md_file_path))
-    print("所有本地md文件生成完毕！开始批量下载图片文件")
+    # 新md文件的完整路径---F:\blog\YuQueBackups\backups\local_md\Go\go-demo\go-demo.md
+    new_md_file_path = os.path.join(new_md_dir, md_file_name)
+    return new_md_dir, new_md_file_path, new_picture_dir
 
 
-def new_md_to_local(md_file_list,is_one_path):
-    # 遍历backups/origin_md目录下所有md文件
-    for md_file_path in md_file_list:
-        # 读取md文件内容
-        old_content = read_file_text_content(md_file_path)
-        # 定位oring_md所在的下标，拼接新生成的md文件的目录要用到
-        absolute_dir_index = md_file_path.find("origin_md")
-        # 新md文件的相对路径---Go\Dubbo-go.md
-        md_relative_path = md_file_path[absolute_dir_index + 10:]
-        
-        # 方式一:所有文档到一个文件夹--对应hexo博客
-        if is_one_path:
-            # 新md文件所在目录---F:\blog\YuQueBackups\backups\local_md
-            new_md_dir = backups_local_md_dir
-            # 新md文件的完整路径---F:\blog\YuQueBackups\backups\local_md\Dubbo-go.md
-            new_md_file_path = os.path.join(new_md_dir, os.path.basename(md_file_path))
-            # 图片的保存路径---F:\blog\YuQueBackups\backups\local_pic
-            new_picture_dir = os.path.join(backups_local_pic_dir)
-        # 方式二:根据文档所处的知识库进行划分,每个文档有各自的图片管理文件夹(图片文档所处文件夹下的images内)
-        else:
-            # 新md文件所在目录---F:\blog\YuQueBackups\backups\local_md\Go\go-demo
-            new_md_dir = os.path.join(backups_local_md_dir, md_relative_path[:-3])
-            # 新md文件的完整路径---F:\blog\YuQueBackups\backups\local_md\Go\go-demo\go-demo.md
-            new_md_file_path = os.path.join(new_md_dir, os.path.basename(md_file_path))
-            # 图片的保存路径---F:\blog\YuQueBackups\backups\local_md\Go\go-demo\images
-            new_picture_dir = os.path.join(new_md_dir, "images")
-        print(new_md_dir)
-        print(new_md_file_path)
-        print(new_picture_dir)
-        # # 路径不存在新建
-        is_dir_existed(new_md_dir)
-        is_dir_existed(new_picture_dir)
-        # # 替换后的md文件内容
-        new_content = pic_match_pattern.sub(partial(pic_to_local, pic_save_dir=new_picture_dir), old_content)
-        # # 生成新的md文件
-        write_text_to_file(new_content, new_md_file_path)
-    # print("新md文件已生成 → {}".format(new_md_file_path))
+# 本地化单个md文件，返回(新md文件路径, 图片记录列表)
+def localize_md_file(md_file_path, is_one_path):
+    # 读取md文件内容
+    old_content = read_file_text_content(md_file_path)
+    # 定位oring_md所在的下标，拼接新生成的md文件的目录要用到
+    absolute_dir_index = md_file_path.find("origin_md")
+    # 新md文件的相对路径---Go\Dubbo-go.md
+    md_relative_path = md_file_path[absolute_dir_index + 10:]
+    new_md_dir, new_md_file_path, new_picture_dir = local_md_paths(md_relative_path, is_one_path)
+    # 路径不存在新建
+    is_dir_existed(new_md_dir)
+    is_dir_existed(new_picture_dir)
+    # 替换后的md文件内容
+    new_content, pic_records = localize_md_content(old_content, new_picture_dir)
+    # 生成新的md文件
+    write_text_to_file(new_content, new_md_file_path)
+    return new_md_file_path, pic_records
+
+
+# 在内存中本地化单篇文档并直接写入local_md，图片放入下载队列(单次写入模式，不经过origin_md)
+def localize_and_save(content, md_relative_path, is_one_path, pic_queue):
+    new_md_dir, new_md_file_path, new_picture_dir = local_md_paths(md_relative_path, is_one_path)
+    is_dir_existed(new_md_dir)
+    is_dir_existed(new_picture_dir)
+    new_content, pic_records = localize_md_content(content, new_picture_dir)
+    write_text_to_file(new_content, new_md_file_path)
+    for pic_url, pic_path in pic_records:
+        pic_queue.put(pic_url, pic_path)
+    return new_md_file_path
+
+
+# md文件本地化
+def md_to_local(md_file_list):
+    return new_md_to_local(md_file_list, False)
+
+
+# md文件批量本地化(多进程)，按输入顺序返回每个文件的(新md文件路径, 图片记录列表)
+def new_md_to_local(md_file_list, is_one_path, workers=None):
+    results = []
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # md_file_list可以是生成器，进行中的任务数有上限，边扫描边本地化
+        for md_file_path in md_file_list:
+            pending.append((md_file_path, executor.submit(localize_md_file, md_file_path, is_one_path)))
+            if len(pending) >= workers * 4:
+                collect_local_result(pending, results)
+        while pending:
+            collect_local_result(pending, results)
     print("所有本地md文件生成完毕！开始批量下载图片文件")
+    return results
 
 
+# 等待最早提交的本地化任务
+def collect_local_result(pending, results):
+    md_file_path, future = pending.popleft()
+    try:
+        results.append(future.result())
+    except Exception as e:
+        print("本地化失败：{}\n{}".format(md_file_path, e))
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python
+"""
+-------------------------------------------------
+   File     : yuque_archive.py
+   Desc     : 备份归档: 文档和图片直接写入单个 zip / tar.zst 文件
+-------------------------------------------------
+"""
+import hashlib
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+import zipfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+archive_index_name = "index.json"
+archive_formats = ("zip", "tar.zst", "tar.gz")
+
+
+# 根据文件名推断归档格式
+def guess_archive_format(archive_path):
+    for archive_format in archive_formats:
+        if archive_path.endswith("." + archive_format):
+            return archive_format
+    return "zip"
+
+
+# 归档索引的旁路文件，tar 格式需要顺序读取，索引单独存放一份便于快速读取
+def archive_index_path(archive_path):
+    return archive_path + ".index.json"
+
+
+# 读取归档索引(不解压整个归档)，归档不存在时返回None
+def read_archive_index(archive_path):
+    index_path = archive_index_path(archive_path)
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if os.path.exists(archive_path) and guess_archive_format(archive_path) == "zip":
+        with zipfile.ZipFile(archive_path) as zf:
+            if archive_index_name in zf.namelist():
+                return json.loads(zf.read(archive_index_name).decode('utf-8'))
+    return None
+
+
+# 读取归档中的单个文件，zip 可以随机读取，tar 需要顺序查找
+def read_archive_member(archive_path, member_path):
+    archive_format = guess_archive_format(archive_path)
+    if archive_format == "zip":
+        with zipfile.ZipFile(archive_path) as zf:
+            return zf.read(member_path)
+    with open_tar_reader(archive_path, archive_format) as tf:
+        for member in tf:
+            if member.name == member_path:
+                return tf.extractfile(member).read()
+    raise KeyError(member_path)
+
+
+# 比较两份归档索引，返回新增、修改、删除的文档ID
+def diff_archive_index(old_index, new_index):
+    old_docs = (old_index or {}).get('docs', {})
+    new_docs = (new_index or {}).get('docs', {})
+    return {
+        'added': sorted(doc_id for doc_id in new_docs if doc_id not in old_docs),
+        'modified': sorted(doc_id for doc_id in new_docs
+                           if doc_id in old_docs and old_docs[doc_id]['sha256'] != new_docs[doc_id]['sha256']),
+        'deleted': sorted(doc_id for doc_id in old_docs if doc_id not in new_docs),
+    }
+
+
+# 以流的方式打开 tar.zst / tar.gz
+def open_tar_reader(archive_path, archive_format):
+    if archive_format == "tar.zst":
+        check_zstandard()
+        stream = zstandard.ZstdDecompressor().stream_reader(open(archive_path, 'rb'), closefd=True)
+        return tarfile.open(fileobj=stream, mode="r|")
+    return tarfile.open(archive_path, mode="r:gz")
+
+
+def check_zstandard():
+    if zstandard is None:
+        raise RuntimeError("tar.zst 归档需要安装 zstandard: pip install zstandard")
+
+
+# 单文件备份归档
+class BackupArchive:
+    def __init__(self, archive_path, archive_format=None):
+        self.archive_path = archive_path
+        self.archive_format = archive_format or guess_archive_format(archive_path)
+        if self.archive_format not in archive_formats:
+            raise ValueError("不支持的归档格式：{}".format(self.archive_format))
+        if self.archive_format == "tar.zst":
+            check_zstandard()
+        # 上一次的归档，没有变化的图片直接从中复制，不需要重新下载
+        self.previous_index = read_archive_index(archive_path) if os.path.exists(archive_path) else None
+        self.previous_files = set((self.previous_index or {}).get('files', {}))
+        self.reused_files = set()
+        self.index = {'version': 1, 'format': self.archive_format, 'docs': {}, 'files': {}}
+        self.lock = threading.Lock()
+        # 先写临时文件，完成后替换，失败时不会破坏上一次的归档
+        self.tmp_path = "{}.{}.tmp".format(archive_path, os.getpid())
+        self.closed = False
+        self._open_writer()
+
+    def __enter__(self):
+        return self
+
+    # 正常退出时完成归档，出现异常时放弃
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.closed:
+            return
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _open_writer(self):
+        if self.archive_format == "zip":
+            self.zip_file = zipfile.ZipFile(self.tmp_path, "w", compression=zipfile.ZIP_DEFLATED)
+            return
+        if self.archive_format == "tar.zst":
+            self.raw_stream = open(self.tmp_path, 'wb')
+            self.stream = zstandard.ZstdCompressor(level=10).stream_writer(self.raw_stream)
+            self.tar_file = tarfile.open(fileobj=self.stream, mode="w|")
+        else:
+            self.raw_stream = None
+            self.stream = None
+            self.tar_file = tarfile.open(self.tmp_path, mode="w:gz")
+
+    def _write_member(self, member_path, data):
+        if self.archive_format == "zip":
+            self.zip_file.writestr(member_path, data)
+        else:
+            info = tarfile.TarInfo(member_path)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.tar_file.addfile(info, io.BytesIO(data))
+
+    # 写入文档并记录索引
+    def add_doc(self, doc_id, member_path, content, updated_at=None, title=None):
+        data = content.encode('utf-8')
+        with self.lock:
+            self._write_member(member_path, data)
+            self.index['docs'][str(doc_id)] = {
+                'path': member_path,
+                'title': title,
+                'updated_at': updated_at,
+                'sha256': hashlib.sha256(data).hexdigest(),
+            }
+
+    # 写入图片等二进制文件
+    def add_file(self, member_path, data):
+        with self.lock:
+            if member_path in self.index['files']:
+                return
+            self._write_member(member_path, data)
+            self.index['files'][member_path] = {'size': len(data)}
+
+    # 上一次的归档中已有该文件时，关闭前直接复制过来，返回是否可以复用
+    def reuse_file(self, member_path):
+        with self.lock:
+            if member_path in self.index['files'] or member_path in self.reused_files:
+                return True
+            if member_path in self.previous_files:
+                self.reused_files.add(member_path)
+                return True
+            return False
+
+    def _copy_reused_files(self):
+        if not self.reused_files:
+            return
+        if self.archive_format == "zip":
+            with zipfile.ZipFile(self.archive_path) as zf:
+                for member_path in sorted(self.reused_files):
+                    self.add_file(member_path, zf.read(member_path))
+            return
+        # tar 只能顺序读取，一次遍历复制所有需要的文件
+        with open_tar_reader(self.archive_path, self.archive_format) as tf:
+            for member in tf:
+                if member.name in self.reused_files:
+                    self.add_file(member.name, tf.extractfile(member).read())
+
+    def _close_writer(self):
+        if self.archive_format == "zip":
+            self.zip_file.close()
+        else:
+            self.tar_file.close()
+            if self.stream is not None:
+                self.stream.close()
+
+    # 放弃本次归档: 关闭写入并删除临时文件，上一次的归档保持不变
+    def abort(self):
+        self.closed = True
+        try:
+            self._close_writer()
+        except Exception:
+            pass
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.unlink(self.tmp_path)
+
+    # 写入索引并完成归档
+    def close(self):
+        try:
+            self._copy_reused_files()
+            self.index['created_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            index_data = json.dumps(self.index, ensure_ascii=False, indent=2)
+            self._write_member(archive_index_name, index_data.encode('utf-8'))
+            self._close_writer()
+            os.replace(self.tmp_path, self.archive_path)
+        except BaseException:
+            self.abort()
+            raise
+        self.closed = True
+        with open(archive_index_path(self.archive_path), 'w', encoding='utf-8') as f:
+            f.write(index_data)
+        return diff_archive_index(self.previous_index, self.index)
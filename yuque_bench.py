@@ -0,0 +1,599 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File     : yuque_bench.py
+   Desc     : 转换和目录处理热点函数的微基准测试: 在生成的语料上计时，保存基线，与基线对比找出性能退化；
+              以及 HTTP/1.1 与 HTTP/2 拉取文档的对比(本地模拟服务)、LibYAML与纯Python YAML实现的输出对比
+-------------------------------------------------
+"""
+import argparse
+import contextlib
+import fnmatch
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yuque_hexo
+from yuque_toc import build_toc_tree
+
+# 规模预设: TOC结点数、正文大小(字节)
+scales = {
+    'small': {'toc': [1000], 'body': [1024, 64 * 1024]},
+    'default': {'toc': [1000, 10000], 'body': [1024, 64 * 1024, 1024 * 1024]},
+    'large': {'toc': [1000, 10000, 50000], 'body': [1024, 64 * 1024, 1024 * 1024]},
+}
+
+# update_tags_from_toc 读写的文章文件数
+tag_file_count = 1000
+
+default_baseline_path = 'yuque_bench.json'
+
+
+def size_label(size):
+    if size >= 1024 * 1024:
+        return f"{size // (1024 * 1024)}MB"
+    return f"{size // 1024}KB"
+
+
+def count_label(count):
+    return f"{count // 1000}k" if count >= 1000 else str(count)
+
+
+# 语料生成(固定随机种子，每次生成的内容相同)
+def make_toc(count, seed=1):
+    """生成TOC列表: 约1/5为目录结点，其余为文档，最多6层"""
+    rng = random.Random(seed)
+    toc = []
+    depths = {'': 0}
+    parents = ['']
+    for i in range(1, count + 1):
+        parent = rng.choice(parents) if rng.random() < 0.9 else ''
+        uuid = f"u{i}"
+        depths[uuid] = depths[parent] + 1
+        if rng.random() < 0.2:
+            toc.append({'type': 'TITLE', 'title': f"目录{i}", 'uuid': uuid, 'parent_uuid': parent, 'doc_id': 0})
+            if depths[uuid] < 6:
+                parents.append(uuid)
+        else:
+            toc.append({'type': 'DOC', 'title': f"文档{i}", 'uuid': uuid, 'parent_uuid': parent, 'doc_id': i,
+                        'slug': f"slug{i}", 'url': f"slug{i}"})
+    return toc
+
+
+def make_body(size, seed=1):
+    """生成语雀风格的markdown正文: 标题、段落、HTML实体、<br />、图片、代码块和锚点"""
+    rng = random.Random(seed)
+    parts = ['---\ntags: [bench]\ndate: 2024-01-01 00:00:00\n---\n'] if seed % 2 else []
+    length = sum(len(part) for part in parts)
+    i = 0
+    while length < size:
+        i += 1
+        kind = rng.random()
+        if kind < 0.1:
+            part = f'<a name="a{i}"></a>\n## 第{i}节 &amp; 小结\n'
+        elif kind < 0.25:
+            ext = rng.choice(['png', 'jpg', 'gif', 'webp'])
+            part = f'![image.{ext}](https://cdn.nlark.com/yuque/0/2024/{ext}/{i}/{rng.getrandbits(48):x}.{ext}' \
+                   f'#averageHue=%23f0f0f0&clientId=u{i}&from=paste)\n'
+        elif kind < 0.35:
+            part = f'```python\nfor i in range({i}):\n    print(i &lt; {i})\n```\n'
+        else:
+            words = ' '.join(rng.choice(['语雀', 'Hexo', '文档', 'markdown', 'sync', '&quot;引用&quot;', '图片'])
+                             for _ in range(rng.randint(8, 40)))
+            part = f'{words}<br /><br />\n' if rng.random() < 0.3 else f'{words}\n\n'
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def make_post(body, doc_id=1):
+    return {'id': doc_id, 'title': f"文档{doc_id}", 'slug': f"slug{doc_id}", 'created_at': '2024-01-01T00:00:00.000Z',
+            'updated_at': '2024-01-02T00:00:00.000Z', 'published_at': '2024-01-01T00:00:00.000Z',
+            'body': body, 'path': f"文档{doc_id}", 'tags': ['目录']}
+
+
+# 测试用例
+def build_cases(scale, workdir):
+    """
+    生成测试用例
+
+    Returns:
+        list: [(用例名称, 无参数的被测函数), ...]
+    """
+    from yeque_md_to_local import localize_md_content
+
+    config = {**yuque_hexo.default_config, 'saveImage': False}
+    cases = []
+    for size in scale['body']:
+        body = make_body(size)
+        post = make_post(body)
+        label = size_label(size)
+        cases.append((f"format_raw[body={label}]", lambda body=body: yuque_hexo.format_raw(body)))
+        cases.append((f"hexo_adapter[body={label}]", lambda post=post: yuque_hexo.hexo_adapter(dict(post), config)))
+        cases.append((f"markdown_adapter[body={label}]",
+                      lambda post=post: yuque_hexo.markdown_adapter(dict(post), config)))
+        cases.append((f"localize_md_content[body={label}]",
+                      lambda body=body: localize_md_content(body, os.path.join(workdir, 'images'))))
+
+    for count in scale['toc']:
+        toc = make_toc(count)
+        toc_tree = build_toc_tree(toc)
+        label = count_label(count)
+        # 查找最后一个文档，get_tags 需要遍历整个目录
+        last_doc_id = next(item['doc_id'] for item in reversed(toc) if item['doc_id'])
+        cases.append((f"get_tags[toc={label}]",
+                      lambda nodes=toc_tree.nodes, doc_id=last_doc_id: yuque_hexo.get_tags(doc_id, nodes)))
+        cases.append((f"build_toc_tree[toc={label}]", lambda toc=toc: build_toc_tree(toc)))
+        cases.append((f"update_tags_from_toc[toc={label},files={count_label(tag_file_count)}]",
+                      tag_update_case(toc, toc_tree, os.path.join(workdir, f"tags_{count}"))))
+        excel_path = os.path.join(workdir, f"toc_{count}.xlsx")
+        cases.append((f"export_toc_to_excel[toc={label}]",
+                      lambda toc_tree=toc_tree, path=excel_path: tag_downloader(workdir).export_toc_to_excel(
+                          toc_tree, path)))
+    return cases
+
+
+_downloaders = {}
+
+
+def tag_downloader(workdir):
+    """工作目录下的下载器(不访问网络)"""
+    if workdir not in _downloaders:
+        config = {**yuque_hexo.default_config, 'login': 'bench', 'repo': 'bench', 'token': 'bench',
+                  'postPath': os.path.join(workdir, 'posts'), 'cachePath': os.path.join(workdir, 'yuque.json'),
+                  'statePath': os.path.join(workdir, 'yuque_state.db')}
+        _downloaders[workdir] = yuque_hexo.Downloader(config)
+    return _downloaders[workdir]
+
+
+def tag_update_case(toc, toc_tree, work_dir):
+    """写入一批文章文件并记录到状态存储，返回对这些文档更新标签的被测函数"""
+    downloader = tag_downloader(work_dir)
+    docs = [item for item in toc if item['doc_id']][:tag_file_count]
+    doc_ids = set()
+    for item in docs:
+        path = os.path.join(downloader.post_basic_path, f"{item['slug']}.md")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"---\ntitle: {item['title']}\ntags: []\ncategories: []\n---\n{make_body(1024, item['doc_id'])}")
+        downloader.state.upsert_doc(item['doc_id'], downloader.repo_key, item['slug'], item['title'], path)
+        doc_ids.add(str(item['doc_id']))
+    downloader.state.commit()
+    return lambda: downloader.update_tags_from_toc(toc_tree, doc_ids)
+
+
+# 计时
+def measure(fn, repeat=5):
+    """
+    自动确定每轮执行次数(每轮至少0.2秒)，执行repeat轮
+
+    Returns:
+        dict: 单次执行的最短/中位耗时(秒)和执行次数
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    timings = [t / number for t in timer.repeat(repeat, number)]
+    return {'best': min(timings), 'median': statistics.median(timings), 'number': number, 'repeat': repeat}
+
+
+def format_time(seconds):
+    if seconds >= 1:
+        return f"{seconds:.3f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f}ms"
+    return f"{seconds * 1e6:.1f}us"
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run_benchmarks(scale_name='default', pattern=None, repeat=5):
+    """
+    执行基准测试
+
+    Returns:
+        dict: {'meta': 运行环境, 'results': {用例名称: 计时结果}}
+    """
+    workdir = tempfile.mkdtemp(prefix='yuque_bench_')
+    results = {}
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            cases = build_cases(scales[scale_name], workdir)
+        for name, fn in cases:
+            if pattern and not fnmatch.fnmatch(name, pattern):
+                continue
+            # 被测函数的日志输出丢弃，不影响结果显示
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                result = measure(fn, repeat)
+            results[name] = result
+            print(f"{name:<52} {format_time(result['best']):>12} {format_time(result['median']):>12}  "
+                  f"x{result['number']}")
+    finally:
+        for downloader in _downloaders.values():
+            downloader.close()
+        _downloaders.clear()
+        shutil.rmtree(workdir, ignore_errors=True)
+    meta = {'scale': scale_name, 'repeat': repeat, 'python': platform.python_version(),
+            'platform': platform.platform(), 'commit': git_commit(),
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    return {'meta': meta, 'results': results}
+
+
+# 基线对比
+def compare_results(baseline, current, threshold=0.1):
+    """
+    按单次最短耗时对比，变慢超过threshold的用例记为退化
+
+    Returns:
+        tuple: (报告行列表, 退化的用例名称列表)
+    """
+    lines = [f"{'case':<52} {'baseline':>12} {'current':>12} {'change':>9}"]
+    regressions = []
+    base_results, current_results = baseline['results'], current['results']
+    for name in sorted(set(base_results) | set(current_results)):
+        base, cur = base_results.get(name), current_results.get(name)
+        if base is None or cur is None:
+            status = 'new' if base is None else 'missing'
+            timing = format_time((cur or base)['best'])
+            lines.append(f"{name:<52} {timing if base else '-':>12} {timing if cur else '-':>12} {'':>9}  {status}")
+            continue
+        change = cur['best'] / base['best'] - 1
+        status = ''
+        if change > threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            status = 'faster'
+        lines.append(f"{name:<52} {format_time(base['best']):>12} {format_time(cur['best']):>12} "
+                     f"{change:>+8.1%}  {status}")
+    return lines, regressions
+
+
+# HTTP/1.1 与 HTTP/2 对比
+def mock_api_response(path, body):
+    """本地模拟的语雀接口，返回 (状态码, JSON内容)"""
+    path = path.split('?')[0]
+    if path.endswith('/user'):
+        data = {'id': 1, 'login': 'bench'}
+    elif path.endswith('/users/1/repos'):
+        data = [{'id': 1, 'namespace': 'bench/bench', 'name': 'bench', 'user': {'login': 'bench'}}]
+    elif '/repos/1/docs/' in path:
+        doc_id = path.rsplit('/', 1)[1]
+        data = {**make_post(body, int(doc_id) if doc_id.isdigit() else 0), 'format': 'markdown'}
+    else:
+        return 404, b'{}'
+    return 200, json.dumps({'data': data}, ensure_ascii=False).encode('utf-8')
+
+
+class Http1MockServer(ThreadingHTTPServer):
+    """HTTP/1.1 模拟服务(keep-alive)，每个请求等待latency秒模拟网络延迟，记录建立的连接数"""
+    daemon_threads = True
+
+    def __init__(self, body, latency):
+        self.body = body
+        self.latency = latency
+        self.connections = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                status, content = mock_api_response(self.path, server.body)
+                self.send_response(status)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        super().__init__(('127.0.0.1', 0), Handler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class Http2MockServer:
+    """HTTP/2(h2c，prior knowledge) 模拟服务，同一连接上的请求并发处理"""
+    def __init__(self, body, latency):
+        import h2.config
+        import h2.connection
+        import h2.events
+        self.h2 = h2
+        self.body = body
+        self.latency = latency
+        self.connections = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+
+    def serve_forever(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def shutdown(self):
+        self.sock.close()
+
+    def _serve(self, sock):
+        h2 = self.h2
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        lock = threading.Lock()
+        conn.initiate_connection()
+        sock.sendall(conn.data_to_send())
+
+        def respond(stream_id, path):
+            time.sleep(self.latency)
+            status, content = mock_api_response(path, self.body)
+            sent = False
+            while not sent:
+                with lock:
+                    if conn.local_flow_control_window(stream_id) >= len(content):
+                        conn.send_headers(stream_id, [(':status', str(status)), ('content-type', 'application/json'),
+                                                      ('content-length', str(len(content)))])
+                        conn.send_data(stream_id, content, end_stream=True)
+                        sock.sendall(conn.data_to_send())
+                        sent = True
+                if not sent:
+                    # 等待客户端的WINDOW_UPDATE
+                    time.sleep(0.001)
+
+        try:
+            while True:
+                data = sock.recv(65535)
+                if not data:
+                    return
+                with lock:
+                    events = conn.receive_data(data)
+                    sock.sendall(conn.data_to_send())
+                for event in events:
+                    if isinstance(event, h2.events.RequestReceived):
+                        path = dict(event.headers)[':path']
+                        threading.Thread(target=respond, args=(event.stream_id, path), daemon=True).start()
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+        except OSError:
+            return
+        finally:
+            sock.close()
+
+
+def fetch_docs(http2, port, docs, concurrency):
+    """用YuqueClient并发拉取文档，返回 (耗时, 失败数, 实际使用的协议)"""
+    config = {**yuque_hexo.default_config, 'baseUrl': f"http://127.0.0.1:{port}/api/v2", 'login': 'bench',
+              'repo': 'bench', 'token': 'bench', 'http2': http2}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        client = yuque_hexo.YuqueClient(config)
+        client.get_repo_id()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(client.get_doc, range(1, docs + 1)))
+        elapsed = time.perf_counter() - started
+    session = client.session
+    if isinstance(session, yuque_hexo.Http2Session):
+        protocol = f"{session.http_version} (fallback)" if session.fallback else session.http_version
+    else:
+        protocol = 'HTTP/1.1'
+    session.close()
+    return elapsed, sum(1 for result in results if not result), protocol
+
+
+def run_http_benchmark(docs=1000, concurrency=32, latency=0.005, body_size=2048):
+    """
+    在本地模拟服务上对比 HTTP/1.1(requests连接池) 和 HTTP/2(httpx，一个多路复用连接) 拉取文档
+
+    Returns:
+        dict: {协议: 结果}
+    """
+    body = make_body(body_size)
+    servers = [('HTTP/1.1', False, Http1MockServer(body, latency))]
+    try:
+        servers.append(('HTTP/2', 'prior-knowledge', Http2MockServer(body, latency)))
+    except ImportError:
+        print("HTTP/2 mock server needs h2: pip install 'httpx[http2]'")
+    print(f"docs: {docs}, concurrency: {concurrency}, latency: {latency * 1000:g}ms, body: {size_label(body_size)}")
+    print(f"{'transport':<10} {'protocol':<20} {'time':>10} {'req/s':>10} {'connections':>12} {'failed':>7}")
+    results = {}
+    for name, http2, server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            elapsed, failed, protocol = fetch_docs(http2, server.port, docs, concurrency)
+        finally:
+            server.shutdown()
+        results[name] = {'protocol': protocol, 'time': elapsed, 'rps': docs / elapsed,
+                         'connections': server.connections, 'failed': failed}
+        print(f"{name:<10} {protocol:<20} {elapsed:>9.3f}s {docs / elapsed:>10.0f} {server.connections:>12} "
+              f"{failed:>7}")
+    return results
+
+
+# LibYAML与纯Python YAML实现的输出对比
+yaml_words = ['语雀', 'Hexo', '文档', 'markdown', '同步', '「引号」', '"双引号"', "'单引号'", 'a: b', '# 注释', '- 列表',
+              'yes', 'null', '~', '0755', '1e3', '2024-01-01', '@at', '%pct', '*star', '&amp', '!tag', '|', '>',
+              '{x}', '[y]', 'tab\t', 'emoji😀', '\u3000全角空格', 'trailing ', ' leading']
+
+
+def make_front_matter(rng, i):
+    """生成front matter属性: 中文、需要加引号的字符串、长字符串、多行字符串、日期和嵌套结构"""
+    def words(low, high):
+        return ' '.join(rng.choice(yaml_words) for _ in range(rng.randint(low, high)))
+    tags = [words(1, 2) for _ in range(rng.randint(0, 4))]
+    data = {
+        'title': words(1, 6),
+        'urlname': f"slug{i}",
+        'date': rng.choice([datetime(2024, 1, 1 + i % 28, i % 24, i % 60), f"2024-01-{1 + i % 28:02d} 08:00:00",
+                            datetime(2024, 2, 1 + i % 28).date()]),
+        'tags': tags,
+        'categories': tags[:1],
+        'description': words(20, 60),
+        'summary': '\n'.join(words(1, 8) for _ in range(rng.randint(1, 4))),
+        'top': rng.random() < 0.5,
+        'weight': rng.choice([i, i / 7, -i, 0]),
+        'meta': {'author': words(1, 2), 'keywords': [words(1, 1) for _ in range(rng.randint(0, 3))]},
+    }
+    if rng.random() < 0.3:
+        data['empty'] = rng.choice([None, '', [], {}])
+    return data
+
+
+@contextlib.contextmanager
+def yaml_backend(loader, dumper):
+    """临时替换yuque_hexo使用的YAML实现"""
+    saved = yuque_hexo.YamlLoader, yuque_hexo.YamlDumper, yuque_hexo.NoAliasDumper
+    no_alias = type('NoAliasDumper', (dumper,), {'ignore_aliases': lambda self, data: True})
+    yuque_hexo.YamlLoader, yuque_hexo.YamlDumper, yuque_hexo.NoAliasDumper = loader, dumper, no_alias
+    try:
+        yield
+    finally:
+        yuque_hexo.YamlLoader, yuque_hexo.YamlDumper, yuque_hexo.NoAliasDumper = saved
+
+
+def yaml_outputs(front_matters, posts):
+    """用当前的YAML实现生成各项输出，返回 {项目: [输出, ...]}"""
+    config = {**yuque_hexo.default_config, 'saveImage': False}
+    dumped = [yuque_hexo.dump_yaml(data) for data in front_matters]
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return {
+            'dump_yaml': dumped,
+            'dump_yaml(no_alias)': [yuque_hexo.dump_yaml(data, no_alias=True) for data in front_matters],
+            'load_yaml': [repr(yuque_hexo.load_yaml(text)) for text in dumped],
+            'set_front_matter_tags': [yuque_hexo.set_front_matter_tags(f"---\n{text}---\n正文\n", ['目录', '子目录'])
+                                      for text in dumped],
+            'hexo_adapter': [yuque_hexo.hexo_adapter(dict(post), config) for post in posts],
+        }
+
+
+def run_yaml_compare(docs=2000, posts=500, seed=1):
+    """
+    对比yuque_hexo使用的YAML实现(可用时解析使用LibYAML)与纯Python实现(SafeLoader/SafeDumper)的输出
+
+    Returns:
+        int: 输出不一致的条数
+    """
+    import yaml
+    rng = random.Random(seed)
+    front_matters = [make_front_matter(rng, i) for i in range(docs)]
+    # 文章正文带front matter(纯Python实现生成)，由hexo_adapter解析后重新生成
+    post_list = []
+    for i in range(posts):
+        text = yaml.dump(front_matters[i % docs], allow_unicode=True, Dumper=yaml.SafeDumper)
+        post_list.append(make_post(f"---\n{text}---\n{make_body(1024, i * 2)}", i + 1))
+    print(f"front matter: {docs}, hexo posts: {posts}, PyYAML {yaml.__version__}, "
+          f"loader: {yuque_hexo.YamlLoader.__name__}, dumper: {yuque_hexo.YamlDumper.__name__}")
+    current = yaml_outputs(front_matters, post_list)
+    with yaml_backend(yaml.SafeLoader, yaml.SafeDumper):
+        pure = yaml_outputs(front_matters, post_list)
+    mismatches = 0
+    for name in current:
+        diffs = [i for i, (a, b) in enumerate(zip(current[name], pure[name])) if a != b]
+        mismatches += len(diffs)
+        print(f"{name:<24} {len(current[name]):>7} {'identical' if not diffs else f'{len(diffs)} differ':>12}")
+        for i in diffs[:3]:
+            print(f"  #{i} current: {current[name][i][:200]!r}")
+            print(f"  #{i} Python : {pure[name][i][:200]!r}")
+    return mismatches
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"results saved to: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for yuque transform and TOC hot paths')
+    subparsers = parser.add_subparsers(dest='command', help='Commands')
+
+    run_parser = subparsers.add_parser('run', help='Run benchmarks')
+    run_parser.add_argument('--scale', choices=list(scales), default='default', help='Corpus size preset')
+    run_parser.add_argument('--filter', dest='pattern', help='Only run cases matching this wildcard')
+    run_parser.add_argument('--repeat', type=int, default=5, help='Timing rounds per case')
+    run_parser.add_argument('--save', nargs='?', const=default_baseline_path,
+                            help=f"Save results as baseline (default: {default_baseline_path})")
+
+    compare_parser = subparsers.add_parser('compare', help='Compare results with a saved baseline')
+    compare_parser.add_argument('baseline', nargs='?', default=default_baseline_path, help='Baseline results file')
+    compare_parser.add_argument('current', nargs='?', help='Results file to compare, runs benchmarks when omitted')
+    compare_parser.add_argument('--filter', dest='pattern', help='Only run cases matching this wildcard')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Slowdown ratio reported as regression (default: 0.1)')
+
+    http_parser = subparsers.add_parser('http', help='Compare HTTP/1.1 and HTTP/2 doc fetching on a local mock server')
+    http_parser.add_argument('--docs', type=int, default=1000, help='Number of docs to fetch')
+    http_parser.add_argument('--concurrency', type=int, default=32, help='Concurrent requests')
+    http_parser.add_argument('--latency', type=float, default=5, help='Simulated server latency in milliseconds')
+    http_parser.add_argument('--body-size', type=int, default=2048, dest='body_size', help='Doc body size in bytes')
+
+    yaml_parser = subparsers.add_parser('yaml',
+                                        help='Check front matter output matches the pure-Python YAML implementation')
+    yaml_parser.add_argument('--docs', type=int, default=2000, help='Number of generated front matter dicts')
+    yaml_parser.add_argument('--posts', type=int, default=500, help='Number of posts rendered with hexo_adapter')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        results = run_benchmarks(args.scale, args.pattern, args.repeat)
+        if args.save:
+            save_results(results, args.save)
+    elif args.command == 'compare':
+        baseline = load_results(args.baseline)
+        if args.current:
+            current = load_results(args.current)
+        else:
+            current = run_benchmarks(baseline['meta']['scale'], args.pattern, baseline['meta'].get('repeat', 5))
+            if args.pattern:
+                baseline['results'] = {name: result for name, result in baseline['results'].items()
+                                       if fnmatch.fnmatch(name, args.pattern)}
+        print(f"baseline: {baseline['meta'].get('commit') or '-'} ({baseline['meta']['time']}), "
+              f"current: {current['meta'].get('commit') or '-'} ({current['meta']['time']})")
+        lines, regressions = compare_results(baseline, current, args.threshold)
+        print('\n'.join(lines))
+        if regressions:
+            print(f"{len(regressions)} regressions (> {args.threshold:.0%} slower)")
+            sys.exit(1)
+    elif args.command == 'http':
+        run_http_benchmark(args.docs, args.concurrency, args.latency / 1000, args.body_size)
+    elif args.command == 'yaml':
+        if run_yaml_compare(args.docs, args.posts):
+            sys.exit(1)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
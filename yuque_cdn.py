@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File     : yuque_cdn.py
+   Desc     : 图床上传: 按内容哈希命名，已存在的对象不重复上传，支持七牛和S3兼容存储
+-------------------------------------------------
+"""
+import hashlib
+import hmac
+import json
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote, urlparse
+
+import requests
+
+# 图片类型对应的扩展名
+image_types = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'image/svg+xml': 'svg',
+}
+
+
+def guess_image_ext(url, content_type=None):
+    """根据Content-Type或URL推断图片扩展名"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in image_types:
+        return image_types[content_type]
+    path = urlparse(url).path
+    ext = path.rsplit('.', 1)[-1].lower() if '.' in path.rsplit('/', 1)[-1] else ''
+    return 'jpg' if ext == 'jpeg' else ext if ext in image_types.values() else 'png'
+
+
+def object_key(data, ext, prefix=''):
+    """按图片内容生成对象名，相同的图片总是得到相同的对象名"""
+    return f"{prefix}{hashlib.sha256(data).hexdigest()[:32]}.{ext}"
+
+
+class ImageUploader(ABC):
+    """
+    图床上传基类，子类实现 exists 和 upload
+
+    Args:
+        cdn_config: imgCdn 配置
+    """
+    def __init__(self, cdn_config):
+        self.config = cdn_config
+        self.bucket = cdn_config.get('bucket', '')
+        self.prefix = cdn_config.get('prefixKey', '')
+        self.host = cdn_config.get('host', '').rstrip('/')
+        self.timeout = cdn_config.get('timeout', 30)
+        self.session = requests.Session()
+
+    def public_url(self, key):
+        """对象的访问地址"""
+        return f"{self.host}/{key}"
+
+    @abstractmethod
+    def exists(self, key):
+        """图床中是否已有该对象"""
+
+    @abstractmethod
+    def upload(self, key, data, content_type):
+        """上传对象"""
+
+    def upload_image(self, url, data, content_type=None):
+        """
+        上传一张图片，图床中已有相同内容时跳过上传
+
+        Returns:
+            tuple: (CDN地址, 内容哈希, 是否实际上传)
+        """
+        ext = guess_image_ext(url, content_type)
+        key = object_key(data, ext, self.prefix)
+        uploaded = False
+        if not self.exists(key):
+            self.upload(key, data, content_type or f"image/{ext}")
+            uploaded = True
+        return self.public_url(key), hashlib.sha256(data).hexdigest(), uploaded
+
+
+class S3Uploader(ImageUploader):
+    """
+    S3兼容存储(AWS S3、MinIO、七牛、腾讯云COS等)，使用 SigV4 签名和 path-style 地址:
+    {endpoint}/{bucket}/{key}
+    """
+    service = 's3'
+
+    def __init__(self, cdn_config):
+        super().__init__(cdn_config)
+        self.endpoint = (cdn_config.get('endpoint') or self.default_endpoint()).rstrip('/')
+        self.region = cdn_config.get('region') or 'us-east-1'
+        self.access_key = cdn_config.get('accessKey', '')
+        self.secret_key = cdn_config.get('secretKey', '')
+        if not self.host:
+            self.host = f"{self.endpoint}/{self.bucket}"
+
+    def default_endpoint(self):
+        raise ValueError("imgCdn.endpoint is required for S3 compatible image bed")
+
+    def _signed_headers(self, method, path, payload, content_type=None):
+        """生成 SigV4 签名请求头"""
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        date = amz_date[:8]
+        payload_hash = hashlib.sha256(payload).hexdigest()
+        headers = {
+            'host': urlparse(self.endpoint).netloc,
+            'x-amz-content-sha256': payload_hash,
+            'x-amz-date': amz_date,
+        }
+        if content_type:
+            headers['content-type'] = content_type
+        signed_headers = ';'.join(sorted(headers))
+        canonical_headers = ''.join(f"{name}:{headers[name].strip()}\n" for name in sorted(headers))
+        canonical_request = '\n'.join([method, path, '', canonical_headers, signed_headers, payload_hash])
+        scope = f"{date}/{self.region}/{self.service}/aws4_request"
+        string_to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()])
+
+        signing_key = ('AWS4' + self.secret_key).encode('utf-8')
+        for part in (date, self.region, self.service, 'aws4_request'):
+            signing_key = hmac.new(signing_key, part.encode('utf-8'), hashlib.sha256).digest()
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        headers['Authorization'] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={signed_headers}, Signature={signature}")
+        del headers['host']
+        return headers
+
+    def _request(self, method, key, payload=b'', content_type=None):
+        path = quote(f"/{self.bucket}/{key}", safe='/~')
+        headers = self._signed_headers(method, path, payload, content_type)
+        return self.session.request(method, f"{self.endpoint}{path}", data=payload or None, headers=headers,
+                                    timeout=self.timeout)
+
+    def exists(self, key):
+        response = self._request('HEAD', key)
+        if response.status_code == 200:
+            return True
+        if response.status_code == 404:
+            return False
+        raise RuntimeError(f"HEAD {key} failed with status {response.status_code}")
+
+    def upload(self, key, data, content_type):
+        response = self._request('PUT', key, data, content_type)
+        if response.status_code not in (200, 201, 204):
+            raise RuntimeError(f"PUT {key} failed with status {response.status_code}: {response.text[:200]}")
+
+
+class QiniuUploader(S3Uploader):
+    """七牛云对象存储，通过七牛的S3兼容接口上传，region 为 cn-east-1、cn-north-1 等"""
+    def default_endpoint(self):
+        return f"https://s3.{self.config.get('region') or 'cn-east-1'}.qiniucs.com"
+
+
+# 图床类型，imgCdn.imageBed 指定；可以用 register_uploader 添加其他图床
+uploaders = {
+    'qiniu': QiniuUploader,
+    's3': S3Uploader,
+}
+
+
+def register_uploader(name, uploader_class):
+    uploaders[name] = uploader_class
+
+
+class CdnService:
+    """
+    图片上传服务: 下载图片并上传到图床，同一图片地址在进程内只处理一次
+
+    Args:
+        cdn_config: imgCdn 配置，imageBed 选择图床类型，concurrency 为并发上传数
+    """
+    def __init__(self, cdn_config):
+        image_bed = cdn_config.get('imageBed', 'qiniu')
+        if image_bed not in uploaders:
+            raise ValueError(f"image bed ({image_bed}) is not supported, available: {', '.join(uploaders)}")
+        self.uploader = uploaders[image_bed](cdn_config)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, cdn_config.get('concurrency') or 1))
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def _transfer(self, url):
+        response = self.uploader.session.get(url, timeout=self.uploader.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"download failed with status code {response.status_code}")
+        return self.uploader.upload_image(url, response.content, response.headers.get('content-type'))
+
+    def submit(self, url):
+        """
+        提交图片上传任务
+
+        Returns:
+            Future: 结果为 (CDN地址, 内容哈希, 是否实际上传)
+        """
+        with self.lock:
+            future = self.futures.get(url)
+            # 失败的任务不缓存，下次重新上传
+            if future is None or (future.done() and future.exception() is not None):
+                future = self.futures[url] = self.executor.submit(self._transfer, url)
+            return future
+
+
+_cdn_services = {}
+_cdn_services_lock = threading.Lock()
+
+
+def get_cdn_service(cdn_config):
+    """获取图片上传服务，同一进程内相同配置只创建一次"""
+    cache_key = json.dumps(cdn_config, sort_keys=True, default=str)
+    with _cdn_services_lock:
+        if cache_key not in _cdn_services:
+            _cdn_services[cache_key] = CdnService(cdn_config)
+        return _cdn_services[cache_key]
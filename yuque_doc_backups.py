@@ -14,6 +14,8 @@ import requests as r
 import time
 from random import randint
 
+from yuque_toc import build_toc_tree, format_path_name, join_toc_path
+
 yq_headers = None
 yq_base_url = "https://www.yuque.com/api/v2/{}"
 backups_base_dir = os.path.join(os.getcwd(), "backups")
@@ -55,19 +57,6 @@ class Repo:
         self.repo_namespace = repo_namespace
 
 
-# 目录结点
-class TocNode:
-    def __init__(self, node_type, node_title, node_uuid, parent_uuid, doc_id, repo_id, repo_name):
-        self.node_type = node_type
-        self.node_title = node_title
-        self.node_uuid = node_uuid
-        self.parent_uuid = parent_uuid
-        self.child_node_list = []
-        self.doc_id = doc_id
-        self.repo_id = repo_id
-        self.repo_name = repo_name
-
-
 # 文档
 class Doc:
     def __init__(self, doc_id, book_id, book_name, doc_slug, doc_title, doc_content):
@@ -129,58 +118,38 @@ def fetch_repo_list(user_id):
     return repo_list
 
 
-# 拉取知识库目录
-def fetch_toc_list(repo_id, repo_name):
+# 拉取知识库目录，doc_handler(文档内容, 保存路径, 文档详情)不为空时由它处理文档，不再写入origin_md
+def fetch_toc_list(repo_id, repo_name, doc_handler=None):
     toc_list_resp = send_request("目录列表", "repos/{}/toc".format(repo_id))
-    id_order_dict = {}
-    root_toc_node = TocNode(None, "根目录", None, None, None, repo_id, repo_name)
-    id_order_dict["root"] = root_toc_node
-    if toc_list_resp:
-        toc_list_json = toc_list_resp.json()
-        for toc in toc_list_json['data']:
-            toc_node = TocNode(toc.get('type'), toc.get('title'), toc.get('uuid'), toc.get('parent_uuid'),toc.get('doc_id'), repo_id, repo_name)
-            id_order_dict[toc_node.node_uuid] = toc_node
-            # 顶级目录
-            if toc_node.parent_uuid is None or len(toc_node.parent_uuid) == 0:
-                root_toc_node.child_node_list.append(toc_node)
-            else:
-                parent_node = id_order_dict.get(toc_node.parent_uuid)
-                if parent_node is None:
-                    exit("父目录不存在")
-                else:
-                    parent_node.child_node_list.append(toc_node)
-    for node in root_toc_node.child_node_list:
-        traverse_nodes(node)
-
-
-# 递归访问目录树的测试方法
-def traverse_nodes(node, save_path=""):
-    save_path += "{}{}".format(os.sep, node.node_title)
-    if node.child_node_list is None or len(node.child_node_list) == 0:
-        if node.node_type == "DOC":
-            format_repo_name = node.repo_name.replace("|", "_").replace("/", "、").replace('"', "'").replace(":", ";")
-            format_save_path = save_path.replace("|", "_").replace("/", "、").replace('"', "'").replace(":", ";")
-            md_save_path = "{}{}{}{}.md".format(backups_origin_md_dir, os.sep, format_repo_name, format_save_path)
-            last_sep_index = md_save_path.rfind(os.sep)
-            if last_sep_index != -1:
-                save_dir = md_save_path[:last_sep_index]
-                is_dir_existed(save_dir)
-                fetch_doc_detail(node, md_save_path)
-        return
-    else:
-        for node in node.child_node_list:
-            traverse_nodes(node, save_path)
+    toc_list = toc_list_resp.json()['data'] if toc_list_resp else []
+    toc_tree = build_toc_tree(toc_list, repo_id, repo_name)
+    if toc_tree.orphan_count > 0:
+        print("有{}个目录结点的父目录不存在，已放到知识库根目录下".format(toc_tree.orphan_count))
+    traverse_nodes(toc_tree, doc_handler)
+
+
+# 遍历目录树，备份没有子结点的文档(迭代实现，不受递归深度限制)
+def traverse_nodes(toc_tree, doc_handler=None):
+    for node, depth, path in toc_tree.iter_docs(leaf_only=True):
+        md_save_path = "{}{}{}{}{}.md".format(backups_origin_md_dir, os.sep, format_path_name(node.repo_name), os.sep,
+                                              join_toc_path(path))
+        if doc_handler is None:
+            is_dir_existed(os.path.dirname(md_save_path))
+        fetch_doc_detail(node, md_save_path, doc_handler)
 
 
 # 拉取单篇文章的详细内容
-def fetch_doc_detail(node, save_path):
+def fetch_doc_detail(node, save_path, doc_handler=None):
     global doc_count
     doc_detail_resp = send_request("文档详情", "repos/{}/docs/{}".format(node.repo_id, node.doc_id))
     if doc_detail_resp:
         doc_detail_json = doc_detail_resp.json()
         doc_detail = doc_detail_json.get('data').get('body')
         if doc_detail is not None and len(doc_detail) > 0:
-            write_text_to_file(doc_detail, save_path)
+            if doc_handler is None:
+                write_text_to_file(doc_detail, save_path)
+            else:
+                doc_handler(doc_detail, save_path, doc_detail_json.get('data'))
             doc_count += 1
             print("第【{}】篇文档备份成功...".format(doc_count))
             time.sleep(sleep_wait)  # 随机休眠2-8s,防止请求被拦截,这个可以看语雀文档,有相关限制
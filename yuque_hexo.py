@@ -2,20 +2,42 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import json
 import time
 import re
 import shutil
 import hashlib
+import fnmatch
+import importlib
+import importlib.metadata
+import multiprocessing.util
 import queue
+import subprocess
 import threading
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
 import requests
-from pathlib import Path
 from html import unescape
 import yaml
 import pandas as pd
 
+from yuque_cdn import get_cdn_service
+from yuque_http import Http2Session
+from yuque_image import ImageOptimizer
+from yuque_toc import build_toc_tree, format_path_name
+from yuque_search import SearchIndex, search_command as run_search
+from yuque_state import StateStore, content_hash, state_command as run_state
+from yuque_webhook import WebhookServer, send_test_webhook
+
+# 解析优先使用LibYAML的C实现, 不可用时回退到纯Python实现;
+# 生成始终使用纯Python实现, LibYAML对长字符串折行和emoji的输出不同(见 yuque_bench.py yaml)
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+from yaml import SafeDumper as YamlDumper
+
 # 当前工作目录
 cwd = os.getcwd()
 
@@ -41,6 +63,7 @@ images_path = 'source/images'
 default_config = {
     'postPath': 'source/_posts/yuque',
     'cachePath': 'yuque.json',
+    'statePath': 'yuque_state.db',
     'lastGeneratePath': '',
     'mdNameFormat': 'title',
     'baseUrl': 'https://www.yuque.com/api/v2/',
@@ -49,6 +72,41 @@ default_config = {
     'repo': '',
     'adapter': 'hexo',
     'concurrency': 5,
+    'renderWorkers': 0,
+    'renderBatchSize': 32,
+    'pipelineQueueSize': 64,
+    # 拉取顺序: updated 按文档更新时间从新到旧，toc 按目录顺序
+    'fetchOrder': 'updated',
+    # 一次同步拉取文档的期限(秒)和数量上限，0为不限制；超出的文档留到下一次同步
+    'fetchDeadline': 0,
+    'fetchBudget': 0,
+    'searchIndexPath': 'yuque_search.db',
+    'postSyncHook': '',
+    # 每次同步输出文件的变化清单(新增、修改、删除的文章和变化的图片)，为空时不写
+    'changesPath': 'yuque_changes.json',
+    # 使用HTTP/2(需要 pip install 'httpx[http2]'): true 通过ALPN协商，"prior-knowledge" 在http地址上也直接使用HTTP/2
+    'http2': False,
+    'watch': {
+        'minInterval': 30,
+        'maxInterval': 600,
+        'backoff': 1.5,
+    },
+    'webhook': {
+        'host': '127.0.0.1',
+        'port': 8930,
+        'path': '/yuque/webhook',
+        'token': '',
+        'debounce': 3,
+    },
+    'imageOptimize': {
+        'enabled': False,
+        'format': 'webp',
+        'quality': 80,
+        'maxWidth': 1920,
+        'maxHeight': 0,
+        'workers': 0,
+        'keepOriginal': False,
+    },
     'onlyPublished': False,
     'onlyPublic': False,
     'imgCdn': {
@@ -59,6 +117,9 @@ default_config = {
         'bucket': '',
         'region': '',
         'prefixKey': '',
+        'endpoint': '',
+        'accessKey': os.environ.get('YUQUE_CDN_ACCESS_KEY', ''),
+        'secretKey': os.environ.get('YUQUE_CDN_SECRET_KEY', ''),
     },
 }
 
@@ -93,6 +154,14 @@ def format_date(date_str):
     dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
     return dt.strftime('%Y-%m-%d %H:%M:%S %z')
 
+def format_file_name(name):
+    """
+    生成文件名: 与备份时的目录名使用相同的替换规则(format_path_name)，
+    再去掉其他不能出现在文件名中的字符
+    """
+    name = re.sub(r'[\\*?<>\x00-\x1f]', '_', format_path_name(name))
+    return name.strip().strip('.')
+
 def format_raw(body):
     """格式化markdown内容"""
     multi_br = re.compile(r'(<br>[\s\n]){2}', re.IGNORECASE)
@@ -126,17 +195,57 @@ def format_list(lst):
             result.append(str(item))
     return f"[{','.join(result)}]"
 
-# 添加 TocNode 类
-class TocNode:
-    def __init__(self, node_type, node_title, node_uuid, parent_uuid, doc_id, repo_id, repo_name):
-        self.node_type = node_type
-        self.node_title = node_title
-        self.node_uuid = node_uuid
-        self.parent_uuid = parent_uuid
-        self.child_node_list = []
-        self.doc_id = doc_id
-        self.repo_id = repo_id
-        self.repo_name = repo_name
+# front matter编解码
+front_matter_pattern = re.compile(r'^---\n([\s\S]*?)\n---\n([\s\S]*)$')
+
+class NoAliasDumper(YamlDumper):
+    """不生成YAML引用(&id001)的Dumper"""
+    def ignore_aliases(self, data):
+        return True
+
+def load_yaml(text):
+    """解析YAML文本"""
+    return yaml.load(text, Loader=YamlLoader)
+
+def dump_yaml(data, no_alias=False):
+    """生成YAML文本，输出与 yaml.dump(data, allow_unicode=True) 保持一致"""
+    dumper = NoAliasDumper if no_alias else YamlDumper
+    return yaml.dump(data, allow_unicode=True, Dumper=dumper)
+
+def split_front_matter(body):
+    """
+    拆分front matter和正文
+
+    Returns:
+        tuple: (front matter数据, 正文)，没有front matter时数据为空字典
+    """
+    # 快速路径: 不以---开头的正文不可能有front matter，跳过正则和YAML解析
+    if not body.startswith('---\n'):
+        return {}, body
+
+    match = front_matter_pattern.match(body)
+    if not match:
+        return {}, body
+
+    try:
+        data = load_yaml(match.group(1)) or {}
+    except yaml.YAMLError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    return data, match.group(2)
+
+def set_front_matter_tags(content, tags):
+    """把生成文章front matter中的tags和categories设置为目录路径，没有front matter时原样返回"""
+    if not content.startswith('---'):
+        return content
+    _, front_matter, body = content.split('---', 2)
+    meta = load_yaml(front_matter)
+    
+    # 直接设置标签和分类，不使用YAML引用
+    meta['tags'] = tags
+    meta['categories'] = tags
+    return f"---\n{dump_yaml(meta, no_alias=True)}---{body}"
 
 # 添加获取标签的函数
 def get_tags(doc_id, toc_data):
@@ -195,16 +304,127 @@ def get_tags(doc_id, toc_data):
     
     return tags
 
+# 请求限流
+class RateLimiter:
+    """
+    令牌桶限流，多个线程、多个知识库共享
+
+    Args:
+        rate: 每秒请求数，0表示不限流
+        burst: 允许的突发请求数，默认与rate相同
+    """
+    def __init__(self, rate=0, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，令牌不足时等待"""
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 先预约令牌再等待，多个线程按到达顺序依次放行
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+# HTTP会话
+def create_http_session(config):
+    """配置了http2时创建HTTP/2会话，不可用时使用requests(HTTP/1.1)"""
+    http2 = config.get('http2', False)
+    if not http2:
+        return requests.Session()
+    try:
+        return Http2Session(prior_knowledge=http2 == 'prior-knowledge',
+                            on_fallback=lambda e: out.warn(f"HTTP/2 failed ({str(e)}), fall back to HTTP/1.1"))
+    except RuntimeError as e:
+        out.warn(f"HTTP/2 disabled: {str(e)}")
+        return requests.Session()
+
+_image_sessions = {}
+_image_sessions_lock = threading.Lock()
+
+def get_image_session(config):
+    """图片下载使用的HTTP会话，每个进程按http2配置只创建一次"""
+    key = config.get('http2', False)
+    with _image_sessions_lock:
+        if key not in _image_sessions:
+            _image_sessions[key] = create_http_session(config)
+        return _image_sessions[key]
+
+# 合并并发的相同请求
+class SingleFlight:
+    """
+    同一个key同时只有一个调用在执行，期间到达的相同调用等待并共用它的结果(或异常)；
+    调用结束后不保留结果，之后的调用会重新执行
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+        if not leader:
+            return call.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
 # 语雀客户端
 class YuqueClient:
-    def __init__(self, config):
+    # 离线客户端不访问网络，也不需要再保存文档原始数据
+    offline = False
+
+    def __init__(self, config, shared=None):
         self.config = config.copy()
         self.token = config['token']
         self.user_id = None
         self.repo_id = None
+        # 同一进程内访问多个知识库时共享连接池、限流器、进行中的请求，以及按token缓存的用户ID和知识库列表
+        if shared is None:
+            shared = {
+                'session': create_http_session(config),
+                'limiter': RateLimiter(config.get('rateLimit', 0)),
+                'flights': SingleFlight(),
+                'user_ids': {},
+                'repos': {},
+            }
+        self.shared = shared
+        # 复用连接，watch模式下长期保持
+        self.session = shared['session']
+        self.limiter = shared['limiter']
         out.info(f"create client: baseUrl: {config['baseUrl']}, login: {config['login']}, repo: {config['repo']}")
 
+    def for_repo(self, config):
+        """创建访问另一个知识库的客户端，与当前客户端共享连接池、限流器和用户信息"""
+        return YuqueClient(config, self.shared)
+
     def _fetch(self, method, api, data=None):
+        if method.upper() != 'GET':
+            return self._request(method, api, data)
+        # 并发的相同GET请求(用户信息、知识库列表、TOC、同一篇文档)只发送一次，共用返回结果
+        key = (self.config['baseUrl'], self.token, api, json.dumps(data, sort_keys=True))
+        return self.shared['flights'].do(key, lambda: self._request(method, api, data))
+
+    def _request(self, method, api, data=None):
         base_url = self.config['baseUrl'].rstrip('/')
         timeout = self.config.get('timeout', 10000) / 1000
         
@@ -218,10 +438,11 @@ class YuqueClient:
                 'X-Auth-Token': self.token
             }
             
+            self.limiter.acquire()
             if method.upper() == 'GET':
-                response = requests.get(path, params=data, timeout=timeout, headers=headers)
+                response = self.session.get(path, params=data, timeout=timeout, headers=headers)
             else:
-                response = requests.post(path, json=data, timeout=timeout, headers=headers)
+                response = self.session.post(path, json=data, timeout=timeout, headers=headers)
             
             if response.status_code != 200:
                 out.error(f"API request failed with status {response.status_code}: {response.text}")
@@ -236,28 +457,45 @@ class YuqueClient:
         """获取用户ID"""
         if self.user_id:
             return self.user_id
+        
+        self.user_id = self.shared['user_ids'].get(self.token)
+        if self.user_id:
+            return self.user_id
             
         user_resp = self._fetch('GET', 'user')
         if user_resp and 'data' in user_resp:
             self.user_id = user_resp['data'].get('id')
+            self.shared['user_ids'][self.token] = self.user_id
             out.info(f"当前用户ID: {self.user_id}")
             return self.user_id
         else:
             out.error("用户ID获取失败，请检查Token")
             return None
 
+    def get_repos(self):
+        """获取用户的知识库列表，同一token只请求一次"""
+        repos = self.shared['repos'].get(self.token)
+        if repos is not None:
+            return repos
+        
+        user_id = self.get_user_id()
+        if not user_id:
+            return None
+        
+        repos_resp = self._fetch('GET', f'users/{user_id}/repos')
+        if not repos_resp or 'data' not in repos_resp:
+            return None
+        self.shared['repos'][self.token] = repos_resp['data']
+        return repos_resp['data']
+
     def get_repo_id(self):
         """获取知识库ID"""
         if self.repo_id:
             return self.repo_id
             
-        user_id = self.get_user_id()
-        if not user_id:
-            return None
-            
-        repos_resp = self._fetch('GET', f'users/{user_id}/repos')
-        if repos_resp and 'data' in repos_resp:
-            for repo in repos_resp['data']:
+        repos = self.get_repos()
+        if repos is not None:
+            for repo in repos:
                 if (repo.get('namespace') == f"{self.config['login']}/{self.config['repo']}" or 
                     (repo.get('name') == self.config['repo'] and 
                      repo.get('user', {}).get('login') == self.config['login'])):
@@ -287,6 +525,63 @@ class YuqueClient:
             
         return self._fetch('GET', f'repos/{repo_id}/docs/{doc_id}')
 
+    def get_docs(self, page_size=100):
+        """获取知识库文档列表(不含正文)，失败时返回None"""
+        repo_id = self.get_repo_id()
+        if not repo_id:
+            return None
+        
+        docs = []
+        offset = 0
+        while True:
+            resp = self._fetch('GET', f'repos/{repo_id}/docs', {'offset': offset, 'limit': page_size})
+            if not resp or 'data' not in resp:
+                return None
+            docs.extend(resp['data'])
+            if len(resp['data']) < page_size:
+                return docs
+            offset += page_size
+
+# 离线客户端
+class OfflineClient:
+    """
+    从状态存储读取上一次在线同步保存的TOC快照和文档原始数据，接口与YuqueClient相同，
+    sync --offline 时用来在没有网络的情况下重新渲染所有文章
+    """
+    offline = True
+
+    def __init__(self, config, state):
+        self.config = config.copy()
+        self.state = state
+        self.repo_key = f"{config['login']}/{config['repo']}"
+        out.info(f"create offline client: repo: {self.repo_key}")
+
+    def for_repo(self, config):
+        return OfflineClient(config, self.state)
+
+    def get_repo_id(self):
+        return None
+
+    def get_toc(self):
+        """最近一次保存的TOC快照"""
+        toc = self.state.latest_toc_snapshot(self.repo_key)
+        if toc is None:
+            out.error(f"no TOC snapshot of {self.repo_key}, run an online sync first")
+            return None
+        return {'data': toc}
+
+    def get_doc(self, doc_id):
+        """保存的文档原始数据，doc_id也可以是slug"""
+        doc = self.state.get_raw_doc(doc_id, self.repo_key)
+        return {'data': doc} if doc is not None else None
+
+    def get_docs(self, page_size=100):
+        """离线时没有文档列表"""
+        return None
+
+# 图片链接
+img_pattern = re.compile(r'!\[([^\]]*)\]\(([^\)]+)\)')
+
 # 图片转本地功能
 def img2local(post, config):
     # 确保images目录存在
@@ -295,12 +590,19 @@ def img2local(post, config):
     out.info(f"Ensuring image directory exists: {img_dir}")
 
     body = post['body']
-    img_pattern = re.compile(r'!\[([^\]]*)\]\(([^\)]+)\)')
     
     def process_image(match):
         alt_text = match.group(1)
         img_url = match.group(2)
         
+        # 离线模式使用上一次保存的图片，不下载
+        local_path = post.get('local_images', {}).get(img_url)
+        if local_path:
+            return f"![{alt_text}](./images/{os.path.basename(local_path)})"
+        if config.get('offline'):
+            out.warn(f"Image is not saved locally, keep the original link in offline mode: {img_url}")
+            return match.group(0)
+        
         try:
             # 创建images目录
             img_dir = os.path.join(cwd, images_path)
@@ -309,7 +611,7 @@ def img2local(post, config):
             
             # 下载图片
             out.info(f"Downloading image from: {img_url}")
-            response = requests.get(img_url, timeout=10)
+            response = get_image_session(config).get(img_url, timeout=10)
             if response.status_code == 200:
                 # 获取图片格式
                 content_type = response.headers.get('content-type', '')
@@ -317,20 +619,20 @@ def img2local(post, config):
                 if ext not in ['jpeg', 'jpg', 'png', 'gif', 'webp']:
                     ext = 'png'
                 
-                # 生成文件名
-                date_str = datetime.now().strftime('%Y%m%d')
-                counter = 1
-                while True:
-                    img_name = f"{date_str}_{counter}.{ext}"
-                    img_path = os.path.join(img_dir, img_name)
-                    if not os.path.exists(img_path):
-                        break
-                    counter += 1
+                # 根据图片URL生成文件名，多个渲染进程同时下载时不会互相覆盖
+                url_hash = hashlib.md5(img_url.encode('utf-8')).hexdigest()
+                img_name = f"{url_hash}.{ext}"
+                img_path = os.path.join(img_dir, img_name)
                 
-                # 保存图片
+                # 保存图片(先写临时文件再替换，避免写出半张图片)
                 out.info(f"Saving image to: {img_path}")
-                with open(img_path, 'wb') as f:
+                tmp_path = f"{img_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
                     f.write(response.content)
+                os.replace(tmp_path, img_path)
+                
+                # 记录图片URL与本地路径的对应关系，写入文章时保存到状态存储
+                post.setdefault('image_map', {})[img_url] = img_path
                 
                 # 返回新的图片链接
                 out.info(f"Image saved successfully: {img_name}")
@@ -352,28 +654,94 @@ def img2local(post, config):
     post['body'] = body
     return post
 
+def get_cdn_config(config):
+    """imgCdn 配置，未配置的项使用默认值"""
+    return {**default_config['imgCdn'], **(config.get('imgCdn') or {})}
+
+def use_img_cdn(config):
+    """是否把图片上传到图床"""
+    return bool(config.get('saveImage', False) and not config.get('localImage')
+                and get_cdn_config(config)['enabled'])
+
 # 图片转CDN功能
 def img2cdn(post, config):
-    """将文章中的图片转为CDN链接或本地存储"""
-    # TODO 实现图片转CDN的逻辑
-    pass    
+    """
+    将文章中的图片上传到图床并替换为CDN链接
 
-# Hexo适配器
-def hexo_adapter(post, config):
-    """Hexo文章生成适配器"""
+    图片按内容哈希命名，图床中已存在时不重复上传；post['cdn_map'] 中已有的图片(上一次同步
+    记录在状态存储中的)直接替换链接，不再下载。一篇文章的图片按 imgCdn.concurrency 并发上传，
+    上传失败的图片保留原链接。
+    """
+    cdn_service = get_cdn_service(get_cdn_config(config))
+    cdn_map = post.setdefault('cdn_map', {})
+
+    body = post['body']
+    pending = {}
+    for match in img_pattern.finditer(body):
+        img_url = match.group(2)
+        if config.get('offline'):
+            # 离线模式只使用已上传过的图片
+            break
+        if img_url not in cdn_map and img_url not in pending and img_url.startswith(('http://', 'https://')):
+            pending[img_url] = cdn_service.submit(img_url)
+
+    for img_url, future in pending.items():
+        try:
+            cdn_url, image_hash, _ = future.result()
+            cdn_map[img_url] = (cdn_url, image_hash)
+            out.info(f"Image on CDN: {img_url} -> {cdn_url}")
+        except Exception as e:
+            out.warn(f"Failed to upload image {img_url} to CDN: {str(e)}")
 
-    # 处理图片
+    def replace_image(match):
+        entry = cdn_map.get(match.group(2))
+        if not entry:
+            return match.group(0)
+        return f"![{match.group(1)}]({entry[0]})"
+
+    post['body'] = img_pattern.sub(replace_image, body)
+    return post
+
+# 适配器共用的预处理
+def preprocess_post(post, config):
+    """
+    处理文章中的图片: 保存到本地或上传到图床
+
+    同一篇文章只处理一次，多个适配器渲染同一篇文章时共用处理结果
+    """
+    if post.get('images_processed'):
+        return post
     if config.get('saveImage', False):
         # 如果开启了本地存储，这里应该调用img2local函数
         if config['localImage']:
             post = img2local(post, config)
         # 如果开启了图片CDN转换，这里应该调用img2cdn函数
-        elif config['imgCdn']['enabled']:
+        elif get_cdn_config(config)['enabled']:
             post = img2cdn(post, config)
-        
+    post['images_processed'] = True
+    return post
+
+def unescaped_body(post):
+    """反转义HTML实体后的正文，同一篇文章只计算一次"""
+    if 'unescaped_body' not in post:
+        post['unescaped_body'] = unescape(post['body'])
+    return post['unescaped_body']
+
+def image_settings(config):
+    """影响图片处理结果的配置，相同时多个输出目标共用一次图片处理"""
+    cdn_config = get_cdn_config(config) if use_img_cdn(config) else None
+    return json.dumps([bool(config.get('saveImage')), bool(config.get('localImage')), cdn_config],
+                      sort_keys=True, default=str)
+
+# Hexo适配器
+def hexo_adapter(post, config):
+    """Hexo文章生成适配器"""
+
+    # 处理图片(多个输出目标时已经处理过)
+    post = preprocess_post(post, config)
     
     # 解析front matter
-    body = unescape(post['body'])
+    body = unescaped_body(post)
     
     # 处理front matter中的<br/>为\n
     regex = re.compile(r'(title:|layout:|tags:|date:|categories:){1}(\S|\s)+?---', re.IGNORECASE)
@@ -390,21 +758,8 @@ def hexo_adapter(post, config):
     for key, value in color_blocks.items():
         body = re.sub(key, value, body, flags=re.IGNORECASE|re.MULTILINE)
     
-    # 这里简化front matter解析，实际应该使用更复杂的解析
-    front_matter_match = re.match(r'^---\n([\s\S]*?)\n---\n([\s\S]*)$', body)
-    
-    if front_matter_match:
-        front_matter_text = front_matter_match.group(1)
-        content = front_matter_match.group(2)
-        
-        # 解析front matter
-        try:
-            data = yaml.safe_load(front_matter_text) or {}
-        except:
-            data = {}
-    else:
-        data = {}
-        content = body
+    # 解析front matter
+    data, content = split_front_matter(body)
     
     # 格式化正文
     raw = format_raw(content)
@@ -443,7 +798,7 @@ def hexo_adapter(post, config):
     props['categories'] = categories
     
     # 生成front matter
-    front_matter = yaml.dump(props, allow_unicode=True)
+    front_matter = dump_yaml(props)
     
     # 生成最终文本
     text = f"---\n{front_matter}---\n\n{raw}"
@@ -453,276 +808,1008 @@ def hexo_adapter(post, config):
 def markdown_adapter(post, config):
     """Markdown文章生成适配器"""
 
-    # 处理图片
-    if config.get('saveImage', False):
-        # 如果开启了本地存储，这里应该调用img2local函数
-        if config['localImage']:
-            post = img2local(post, config)
-        # 如果开启了图片CDN转换，这里应该调用img2cdn函数
-        elif config['imgCdn']['enabled']:
-            post = img2cdn(post, config)
+    # 处理图片(多个输出目标时已经处理过)
+    post = preprocess_post(post, config)
     
     body = post['body']
     raw = format_raw(body)
     return raw
 
 
+# 适配器插件
+class Adapter:
+    """
+    适配器: 把文章数据转换为输出文本
+
+    插件可以是 transform(post, config) 函数，也可以是类或对象，提供 transform 以及可选的钩子:
+        begin_batch(config): 一次同步中第一次使用前调用一次，例如加载链接映射
+        transform_many(posts, config): 一次转换一批文章，返回文本列表，默认逐篇调用 transform
+        end_batch(config): 同步结束时调用一次
+    插件的 front_matter_tags 属性为真时表示输出Hexo front matter，写入时按目录路径设置 tags/categories
+    传给适配器的文章已经处理过图片，HTML反转义后的正文可以用 unescaped_body(post) 获取。
+    """
+    def __init__(self, name, plugin):
+        if isinstance(plugin, type):
+            plugin = plugin()
+        self.name = name
+        self.plugin = plugin
+        self._transform = getattr(plugin, 'transform', plugin)
+        self.front_matter_tags = bool(getattr(plugin, 'front_matter_tags', False))
+        if not callable(self._transform):
+            raise TypeError(f"adapter ({name}) has no transform")
+
+    def begin_batch(self, config):
+        hook = getattr(self.plugin, 'begin_batch', None)
+        if hook:
+            hook(config)
+
+    def transform(self, post, config):
+        return self._transform(post, config)
+
+    def transform_many(self, posts, config):
+        hook = getattr(self.plugin, 'transform_many', None)
+        if hook:
+            return list(hook(posts, config))
+        return [self._transform(post, config) for post in posts]
+
+    def end_batch(self, config):
+        hook = getattr(self.plugin, 'end_batch', None)
+        if hook:
+            hook(config)
+
+# 只有Hexo适配器输出按目录路径生成的 tags/categories
+hexo_adapter.front_matter_tags = True
+
+# 内置适配器
+builtin_adapters = {
+    'markdown': markdown_adapter,
+    'hexo': hexo_adapter,
+}
+
+# 第三方包通过这个 entry point 组注册适配器，例如 pyproject.toml 中:
+# [project.entry-points."yuque_hexo.adapters"]
+# mysite = "mysite_adapter:MySiteAdapter"
+adapter_entry_point_group = 'yuque_hexo.adapters'
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+def load_adapter(adapter_name):
+    """按名称加载适配器: 内置适配器、entry point 注册的插件，或 "模块:属性" 形式的路径(模块可以放在博客目录下)"""
+    if adapter_name in builtin_adapters:
+        return Adapter(adapter_name, builtin_adapters[adapter_name])
+    if ':' in adapter_name:
+        module_name, attr = adapter_name.split(':', 1)
+        if cwd not in sys.path:
+            sys.path.insert(0, cwd)
+        plugin = importlib.import_module(module_name)
+        for part in attr.split('.'):
+            plugin = getattr(plugin, part)
+        return Adapter(adapter_name, plugin)
+    for entry_point in importlib.metadata.entry_points(group=adapter_entry_point_group):
+        if entry_point.name == adapter_name:
+            return Adapter(adapter_name, entry_point.load())
+    raise LookupError('not a builtin adapter, registered plugin or "module:attr" path')
+
 # 获取适配器
 def get_adapter(adapter_name, config):
-    """获取适配器函数"""
-    internal_adapters = ['markdown', 'hexo']
-    
-    if adapter_name in internal_adapters:
-        if adapter_name == 'markdown':
-            return markdown_adapter
-        elif adapter_name == 'hexo':
-            return hexo_adapter
-    else:
-        # 自定义适配器，这里简化处理，实际应该支持自定义适配器
-        out.error(f"adapter ({adapter_name}) is invalid.")
-        exit(-1)
+    """获取适配器，同一进程内每个适配器只加载一次"""
+    with _adapters_lock:
+        adapter = _adapters.get(adapter_name)
+        if adapter is None:
+            try:
+                adapter = _adapters[adapter_name] = load_adapter(adapter_name)
+            except Exception as e:
+                out.error(f"adapter ({adapter_name}) is invalid: {str(e)}")
+                exit(-1)
+    return adapter
 
-# 下载器
-class Downloader:
-    def __init__(self, config):
-        self.client = YuqueClient(config)
-        self.config = config
-        self.cache_path = os.path.join(cwd, config['cachePath'])
-        self.post_basic_path = os.path.join(cwd, config['postPath'])
-        self._cached_articles = []
-        
-        # 确保目录存在
-        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
-        os.makedirs(self.post_basic_path, exist_ok=True)
+class AdapterBatch:
+    """
+    一次同步中的适配器批次: 每个输出目标第一次渲染前调用适配器的 begin_batch，close 时调用 end_batch，
+    适配器加载的资源在整批文章之间共用
+    """
+    def __init__(self):
+        self.begun = {}
+        self.lock = threading.Lock()
 
-    def get_file_name(self, post):
-        """
-        根据配置获取文件名
-        
-        Args:
-            post: 文章信息字典
-            
-        Returns:
-            str: 文件名（不包含扩展名）
-        """
-        name_format = self.config.get('mdNameFormat', 'title')
-        
-        if name_format == 'title':
-            # 使用标题作为文件名
-            title = post.get('title', '').strip()
-            if not title:
-                return post.get('slug', 'untitled')
-            return title
-        elif name_format == 'slug':
-            # 使用 slug 作为文件名
-            return post.get('slug', 'untitled')
-        elif name_format == 'timestamp':
-            # 使用时间戳作为文件名
-            timestamp = int(time.time())
-            return f"{timestamp}_{post.get('slug', 'untitled')}"
-        else:
-            # 默认使用标题
-            return post.get('title', post.get('slug', 'untitled'))
+    def adapter(self, config):
+        """获取输出目标的适配器，第一次使用时开始批次"""
+        key = json.dumps(config, sort_keys=True, default=str)
+        with self.lock:
+            entry = self.begun.get(key)
+            if entry is None:
+                adapter = get_adapter(config['adapter'], config)
+                adapter.begin_batch(config)
+                entry = self.begun[key] = (adapter, config)
+        return entry[0]
 
-    def traverse_toc(self, toc_data, parent_path=''):
-        """递归遍历目录结构，下载文档"""
-        if not toc_data or 'data' not in toc_data:
-            return
-            
-        for item in toc_data['data']:
-            current_path = os.path.join(parent_path, item.get('title', ''))
-            
-            if item.get('type') == 'DOC' and item.get('doc_id'):
-                # 获取文档详情
-                doc_resp = self.client.get_doc(item['doc_id'])
-                if doc_resp and 'data' in doc_resp:
-                    doc = doc_resp['data']
-                    
-                    # 准备文档数据
-                    article = {
-                        'title': doc.get('title', ''),
-                        'slug': doc.get('slug', ''),
-                        'created_at': doc.get('created_at', ''),
-                        'updated_at': doc.get('updated_at', ''),
-                        'published_at': doc.get('published_at', ''),
-                        'body': doc.get('body', ''),
-                        'path': current_path,  # 保存文档路径
-                        'tags': current_path.split(os.sep)[:-1]  # 使用路径作为标签
-                    }
-                    
-                    # 保存到缓存
-                    self._cached_articles.append(article)
-                    
-                    # 生成文档
-                    self.generate_post(article)
-            
-            # 递归处理子目录
-            if item.get('children'):
-                self.traverse_toc({'data': item['children']}, current_path)
+    def close(self):
+        with self.lock:
+            begun, self.begun = self.begun, {}
+        for adapter, config in begun.values():
+            try:
+                adapter.end_batch(config)
+            except Exception as e:
+                out.error(f"adapter ({adapter.name}) end_batch failed: {str(e)}")
 
-    def update_tags_from_toc(self, toc_data):
-        """从TOC更新文档的标签"""
-        if not toc_data or 'data' not in toc_data:
-            return
-        
-        # 创建文档标题到路径的映射
-        doc_paths = {}
-        
-        def traverse_toc(items):
-            for item in items:
-                if item.get('type') == 'DOC':
-                    # 获取完整路径
-                    path = []
-                    current = item
-                    while current.get('parent_uuid'):
-                        for node in toc_data['data']:
-                            if node['uuid'] == current['parent_uuid']:
-                                path.insert(0, node['title'])
-                                current = node
-                                break
-                    
-                    # 保存文档标题和路径的映射
-                    doc_paths[item['title']] = path  # 不包含文档本身的标题
-        
-        # 遍历TOC构建路径映射
-        traverse_toc(toc_data['data'])
-        
-        # 更新已下载文档的标签
-        updated_count = 0
-        for root, _, files in os.walk(self.post_basic_path):
-            for file in files:
-                if not file.endswith('.md'):
-                    continue
-                    
-                file_path = os.path.join(root, file)
-                try:
-                    # 读取markdown文件
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # 解析front matter
-                    if content.startswith('---'):
-                        _, front_matter, body = content.split('---', 2)
-                        meta = yaml.safe_load(front_matter)
-                        
-                        # 获取文档标题
-                        title = meta.get('title', '')
-                        if title in doc_paths:
-                            # 更新标签和分类
-                            tags = doc_paths[title]
-                            
-                            # 直接设置标签和分类，不使用YAML引用
-                            meta['tags'] = tags
-                            meta['categories'] = tags
-                            
-                            # 使用自定义的YAML dumper
-                            class NoAliasDumper(yaml.SafeDumper):
-                                def ignore_aliases(self, data):
-                                    return True
-                            
-                            # 重新生成文档
-                            new_content = f"---\n{yaml.dump(meta, allow_unicode=True, Dumper=NoAliasDumper)}---{body}"
-                            
-                            # 写回文件
-                            with open(file_path, 'w', encoding='utf-8') as f:
-                                f.write(new_content)
-                                
-                            updated_count += 1
-                            out.info(f"Updated tags for: {title}")
-                            out.info(f"New tags: {tags}")
-                
-                except Exception as e:
-                    out.error(f"Failed to update tags for {file}: {str(e)}")
-        
-        out.info(f"Updated tags for {updated_count} documents")
+def prepare_targets(post, configs):
+    """
+    按各输出目标的图片配置预处理文章，图片处理和HTML反转义按图片配置只做一次，结果在各个适配器之间共用；
+    处理过程中记录的图片信息合并回post
+
+    Returns:
+        list: 与configs一一对应的预处理后的文章
+    """
+    prepared = {}
+    posts = []
+    for config in configs:
+        key = image_settings(config)
+        if key not in prepared:
+            prepared[key] = preprocess_post(dict(post), config)
+        posts.append(prepared[key])
+    for shared in prepared.values():
+        for field in image_fields:
+            if field in shared:
+                post.setdefault(field, {}).update(shared[field])
+    return posts
+
+def render_posts(entries, batch):
+    """
+    批量渲染文章，同一输出目标的文章一次交给适配器的 transform_many
+
+    Args:
+        entries: [(文章, [配置, ...]), ...]，同一输出目标的文章共用一个配置对象
+        batch: 适配器批次
+
+    Returns:
+        list: 与entries一一对应的 [文本, ...]
+    """
+    texts = [[None] * len(configs) for _, configs in entries]
+    targets = {}
+    for i, (post, configs) in enumerate(entries):
+        for j, (target_post, config) in enumerate(zip(prepare_targets(post, configs), configs)):
+            targets.setdefault(id(config), (config, []))[1].append((i, j, target_post))
+    for config, items in targets.values():
+        adapter = batch.adapter(config)
+        results = adapter.transform_many([target_post for _, _, target_post in items], config)
+        if len(results) != len(items):
+            raise ValueError(f"adapter ({adapter.name}) returned {len(results)} texts for {len(items)} posts")
+        for (i, j, _), text in zip(items, results):
+            texts[i][j] = text
+    return texts
+
+def render_targets(post, configs, batch):
+    """
+    把一篇文章渲染到多个输出目标
 
-    def auto_update(self):
-        """执行完整的更新流程"""
+    Returns:
+        list: 与configs一一对应的文本
+    """
+    return render_posts([(post, configs)], batch)[0]
+
+def create_image_optimizer(config):
+    """开启imageOptimize时创建图片优化器，没有安装Pillow时给出警告并跳过优化"""
+    options = config.get('imageOptimize') or {}
+    if not options.get('enabled'):
+        return None
+    try:
+        return ImageOptimizer(options)
+    except RuntimeError as e:
+        out.warn(f"image optimization skipped: {str(e)}")
+        return None
+
+def submit_image_optimization(optimizer, post):
+    """提交文章中已保存到本地的图片，返回 {图片地址: Future}"""
+    futures = {}
+    for img_url, img_path in post.get('image_map', {}).items():
         try:
-            # 获取目录结构
-            toc_data = self.client.get_toc()
-            if not toc_data:
-                out.error("Failed to get TOC data")
-                return
-                
-            # 清空缓存
-            self._cached_articles = []
-            
-            # 遍历目录结构，下载文档
-            self.traverse_toc(toc_data)
-            
-            # 从TOC更新标签
-            self.update_tags_from_toc(toc_data)
-            
-            # 导出TOC到Excel
-            self.export_toc_to_excel(toc_data)
-            
-            out.info('download articles done!')
+            futures[img_url] = optimizer.submit(img_path)
+        except OSError as e:
+            out.warn(f"Failed to optimize image {img_path}: {str(e)}")
+    return futures
+
+def apply_optimized_images(optimizer, post, texts, futures):
+    """等待图片优化完成，把各输出目标文本中的图片链接替换为优化后的图片"""
+    for img_url, future in futures.items():
+        img_path = post['image_map'][img_url]
+        try:
+            new_path = optimizer.result(img_path, future)
         except Exception as e:
-            out.error(f"Auto update failed: {str(e)}")
-            raise
+            out.warn(f"Failed to optimize image {img_path}: {str(e)}")
+            continue
+        if new_path != img_path:
+            old_link, new_link = f"./images/{os.path.basename(img_path)}", f"./images/{os.path.basename(new_path)}"
+            texts = [text.replace(old_link, new_link) for text in texts]
+            post['image_map'][img_url] = new_path
+    return texts
 
-    def generate_post(self, post):
-        """生成单篇文章"""
-        file_name = self.get_file_name(post)
-        post_path = os.path.join(self.post_basic_path, f"{file_name}.md")
-        
-        # 获取适配器
-        adapter_name = self.config['adapter']
-        transform = get_adapter(adapter_name, self.config)
-        
-        out.info(f"generate post file: {post_path}")
-        text = transform(post, self.config)
-        
-        # 确保目录存在
-        os.makedirs(os.path.dirname(post_path), exist_ok=True)
-        
-        # 写入文件
-        with open(post_path, 'w', encoding='utf-8') as f:
-            f.write(text)
+def fetch_post(downloaders, item, toc_path):
+    """拉取文档，同一知识库的多个输出目标共用一次拉取"""
+    article = downloaders[0].fetch_article(item, toc_path)
+    if article and 'cdn_map' not in article and any(use_img_cdn(downloader.config) for downloader in downloaders):
+        article['cdn_map'] = downloaders[0].known_cdn_images(article['body'])
+    return article
 
-    def export_toc_to_excel(self, toc_data, output_path=None):
-        """导出TOC到Excel文件"""
-        if not output_path:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_path = f'yuque_toc_{timestamp}.xlsx'
-        
-        # 准备数据
-        rows = []
-        
-        def traverse_toc(items, level=0):
-            for item in items:
-                # 获取完整路径
-                path = []
-                current = item
-                while current.get('parent_uuid'):
-                    for node in toc_data['data']:
-                        if node['uuid'] == current['parent_uuid']:
-                            path.insert(0, node['title'])
-                            current = node
-                            break
-                path.append(item['title'])
-                
-                rows.append({
-                    '层级': level,
-                    '类型': item.get('type', ''),
-                    '标题': item.get('title', ''),
-                    '文档ID': item.get('doc_id', ''),
-                    '路径': '/'.join(path) if path else item.get('title', '')
-                })
-                
-                # 递归处理子目录
-                if item.get('children'):
-                    traverse_toc(item['children'], level + 1)
-        
-        # 遍历TOC构建数据
-        traverse_toc(toc_data['data'])
-        
-        # 创建DataFrame
-        df = pd.DataFrame(rows)
-        
-        # 调整列顺序和名称
-        df = df[['层级', '类型', '标题', '文档ID', '路径']]
+def iter_group_docs(downloaders, toc_tree, doc_ids=None):
+    """
+    遍历同一知识库的目录树，依次产出 ([需要该文档的下载器, ...], 文档条目, 路径)
+
+    Args:
+        downloaders: 同一知识库各输出目标的下载器，按各自的过滤规则选择文档
+        doc_ids: {下载器: doc_id集合}，为空时返回所有文档
+    """
+    for node, depth, path in toc_tree.iter_docs():
+        doc_id = str(node.doc_id)
+        accepted = [downloader for downloader in downloaders if downloader.accepts(path)
+                    and (doc_ids is None or doc_id in doc_ids.get(downloader, ()))]
+        if accepted:
+            yield accepted, node.item, path[:]
+
+def is_stale(doc_item, stale_docs):
+    """文档是否需要重新生成，stale_docs 中没有该知识库时视为需要"""
+    downloaders, item, path = doc_item
+    repo_key = downloaders[0].repo_key
+    return not stale_docs or repo_key not in stale_docs or str(item.get('doc_id')) in stale_docs[repo_key]
+
+def order_by_freshness(doc_items, updated_times, stale_docs=None):
+    """
+    按文档更新时间从新到旧排列待拉取的文档，没有更新时间的排在最后，时间相同时保持原来的顺序
+
+    Args:
+        doc_items: ([下载器, ...], TOC条目, 路径)
+        updated_times: {知识库: {doc_id: updated_at}}
+        stale_docs: {知识库: 需要重新生成的doc_id集合}，其中的文档排在已是最新的文档之前；没有的知识库全部视为需要生成
+    """
+    def priority(doc_item):
+        downloaders, item, path = doc_item
+        updated_at = updated_times.get(downloaders[0].repo_key, {}).get(str(item.get('doc_id'))) or ''
+        return is_stale(doc_item, stale_docs), updated_at
+    return sorted(doc_items, key=priority, reverse=True)
+
+def generate_posts(downloaders, post, batch=None):
+    """
+    渲染文章并写入各下载器的输出目标
+
+    Args:
+        batch: 适配器批次，连续生成多篇文章时传入同一个批次；为空时只为这一篇文章开始和结束批次
+    """
+    if batch is None:
+        batch = AdapterBatch()
+        try:
+            texts = render_targets(post, [downloader.config for downloader in downloaders], batch)
+        finally:
+            batch.close()
+    else:
+        texts = render_targets(post, [downloader.config for downloader in downloaders], batch)
+    # imageOptimize只能在顶层配置(见get_source_configs)，各输出目标相同
+    optimizer = create_image_optimizer(downloaders[0].config) if post.get('image_map') else None
+    if optimizer:
+        try:
+            texts = apply_optimized_images(optimizer, post, texts, submit_image_optimization(optimizer, post))
+        finally:
+            optimizer.close()
+    for downloader, text in zip(downloaders, texts):
+        downloader.write_post(post, text)
+
+# 渲染时记录的图片信息，多进程渲染时需要传回主进程
+image_fields = ('image_map', 'cdn_map')
+
+# 渲染进程中的适配器批次，进程退出时结束
+_worker_batch = None
+
+def init_render_worker():
+    """渲染进程初始化: 适配器批次在整个进程内共用，进程退出时调用各适配器的 end_batch"""
+    global _worker_batch
+    _worker_batch = AdapterBatch()
+    multiprocessing.util.Finalize(None, _worker_batch.close, exitpriority=10)
+
+def render_batch(entries):
+    """
+    批量渲染文章，在渲染进程中执行
+
+    Args:
+        entries: [(文章, [配置, ...]), ...]，同一输出目标的文章共用一个配置对象，序列化时只传一份
+
+    Returns:
+        list: [([文本, ...], 图片信息), ...]
+    """
+    texts = render_posts(entries, _worker_batch)
+    return [(post_texts, {field: post[field] for field in image_fields if field in post})
+            for post_texts, (post, _) in zip(texts, entries)]
+
+class RenderPool:
+    """
+    多进程渲染池
+
+    文章按批次发送到子进程渲染，降低进程间通信开销；
+    进行中的批次数有上限，超过时等待最早的批次完成后再继续提交。
+    """
+    def __init__(self, config, write_post):
+        self.write_post = write_post
+        self.workers = config['renderWorkers']
+        self.batch_size = max(1, config.get('renderBatchSize', 32))
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_render_worker)
+        self._batch = []
+        self._inflight = []
+        out.info(f"render pool started: workers: {self.workers}, batch size: {self.batch_size}")
+
+    def submit(self, downloaders, post):
+        """加入待渲染批次，批次满时提交到子进程"""
+        self._batch.append((downloaders, post))
+        if len(self._batch) >= self.batch_size:
+            self._submit_batch()
+
+    def _submit_batch(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        future = self.executor.submit(render_batch, [(post, [downloader.config for downloader in downloaders])
+                                                     for downloaders, post in batch])
+        self._inflight.append((batch, future))
+        while len(self._inflight) > self.workers * 2:
+            self._collect()
+
+    def _collect(self):
+        """等待最早提交的批次并写入文件"""
+        batch, future = self._inflight.pop(0)
+        try:
+            results = future.result()
+        except Exception as e:
+            out.error(f"Failed to render {len(batch)} posts: {str(e)}")
+            return
+        for (downloaders, post), (texts, images) in zip(batch, results):
+            post.update(images)
+            self.write_post(downloaders, post, texts)
+
+    def close(self):
+        """提交剩余文章，等待全部渲染完成"""
+        try:
+            self._submit_batch()
+            while self._inflight:
+                self._collect()
+        finally:
+            self.executor.shutdown()
+
+# 管道结束标记
+_STOP = object()
+
+class SyncPipeline:
+    """
+    同步管道: TOC遍历 → 拉取 → 渲染 → (图片优化) → 写入
+
+    各阶段之间使用有界队列连接，下游处理不过来时上游阻塞等待(背压)，
+    内存中同时存在的文章数量与知识库大小无关。
+    多个知识库的文档可以进入同一条管道，由各自的下载器拉取和写入；
+    同一文档输出到多个目标时只拉取一次，渲染后分别写入各个目标。
+    超过拉取期限(fetchDeadline)或数量上限(fetchBudget)后不再拉取，剩下的文档记录在deferred中。
+    """
+    def __init__(self, config):
+        self.config = config
+        self.fetch_workers = max(1, config.get('concurrency', 5))
+        self.render_batch_size = max(1, config.get('renderBatchSize', 32))
+        deadline = config.get('fetchDeadline') or 0
+        self.deadline = time.monotonic() + deadline if deadline > 0 else None
+        self.budget = config.get('fetchBudget') or 0
+        self.deferred = []
+        self.deferred_lock = threading.Lock()
+        queue_size = max(1, config.get('pipelineQueueSize', 64))
+        self.fetch_queue = queue.Queue(maxsize=queue_size)
+        self.render_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        # 图片优化在进程池中进行，写入前等待结果并替换链接
+        self.optimizer = create_image_optimizer(config)
+
+    def run(self, doc_items):
+        """
+        执行同步
+
+        Args:
+            doc_items: 可迭代的 ([下载器, ...], TOC条目, 文档路径)，同一知识库各输出目标的下载器
+        """
+        fetchers = [threading.Thread(target=self._fetch_loop, daemon=True)
+                    for _ in range(self.fetch_workers)]
+        renderer = threading.Thread(target=self._render_loop, daemon=True)
+        writer = threading.Thread(target=self._write_loop, daemon=True)
+        for thread in fetchers + [renderer, writer]:
+            thread.start()
+
+        try:
+            started = 0
+            for doc_item in doc_items:
+                if self.expired() or (self.budget and started >= self.budget):
+                    self.defer(doc_item)
+                    continue
+                self.fetch_queue.put(doc_item)
+                started += 1
+        finally:
+            for _ in fetchers:
+                self.fetch_queue.put(_STOP)
+            for thread in fetchers:
+                thread.join()
+            self.render_queue.put(_STOP)
+            renderer.join()
+            self.write_queue.put(_STOP)
+            writer.join()
+            if self.optimizer:
+                self.optimizer.close()
+        if self.deferred:
+            out.warn(f"fetch deadline or budget reached, {len(self.deferred)} docs not fetched")
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def defer(self, doc_item):
+        with self.deferred_lock:
+            self.deferred.append(doc_item)
+
+    def _fetch_loop(self):
+        while True:
+            doc_item = self.fetch_queue.get()
+            if doc_item is _STOP:
+                return
+            # 在队列中等待时已超过期限
+            if self.expired():
+                self.defer(doc_item)
+                continue
+            downloaders, item, path = doc_item
+            try:
+                article = fetch_post(downloaders, item, path)
+            except Exception as e:
+                out.error(f"Failed to fetch doc {item.get('doc_id')}: {str(e)}")
+                continue
+            if article:
+                self.render_queue.put((downloaders, article))
+
+    def _render_loop(self):
+        render_pool = None
+        if self.config.get('renderWorkers', 0) > 0:
+            render_pool = RenderPool(self.config, self._rendered)
+        batch = AdapterBatch()
+        try:
+            while True:
+                entry = self.render_queue.get()
+                if entry is _STOP:
+                    return
+                if render_pool:
+                    render_pool.submit(*entry)
+                    continue
+                # 不使用进程池时在本线程渲染，队列中已有的文章(最多renderBatchSize篇)一起交给 transform_many，不等待凑满批次
+                entries = [entry]
+                stopped = False
+                while len(entries) < self.render_batch_size:
+                    try:
+                        entry = self.render_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if entry is _STOP:
+                        stopped = True
+                        break
+                    entries.append(entry)
+                self._render_entries(entries, batch)
+                if stopped:
+                    return
+        finally:
+            if render_pool:
+                render_pool.close()
+            batch.close()
+
+    def _render_entries(self, entries, batch):
+        """在本线程批量渲染，整批失败时逐篇重试，只跳过出错的文章"""
+        try:
+            results = render_posts([(article, [downloader.config for downloader in downloaders])
+                                    for downloaders, article in entries], batch)
+        except Exception as e:
+            if len(entries) == 1:
+                out.error(f"Failed to render {entries[0][1]['title']}: {str(e)}")
+                return
+            for entry in entries:
+                self._render_entries([entry], batch)
+            return
+        for (downloaders, article), texts in zip(entries, results):
+            self._rendered(downloaders, article, texts)
+
+    def _rendered(self, downloaders, post, texts):
+        """渲染完成的文章进入写入队列，同时提交图片优化"""
+        image_futures = None
+        if self.optimizer and post.get('image_map'):
+            image_futures = submit_image_optimization(self.optimizer, post)
+        self.write_queue.put((downloaders, post, texts, image_futures))
+
+    def _write_loop(self):
+        while True:
+            entry = self.write_queue.get()
+            if entry is _STOP:
+                return
+            downloaders, post, texts, image_futures = entry
+            if image_futures:
+                texts = apply_optimized_images(self.optimizer, post, texts, image_futures)
+            for downloader, text in zip(downloaders, texts):
+                try:
+                    downloader.write_post(post, text)
+                except Exception as e:
+                    out.error(f"Failed to write {post['title']} to {downloader.name}: {str(e)}")
+
+# 下载器
+class Downloader:
+    def __init__(self, config, client=None, state=None):
+        """
+        Args:
+            config: 单个知识库的配置
+            client: 共享的语雀客户端，为空时新建
+            state: 共享的状态存储，为空时打开statePath，由下载器负责关闭
+        """
+        self.client = client or YuqueClient(config)
+        self.config = config
+        self.cache_path = os.path.join(cwd, config['cachePath'])
+        self.post_basic_path = os.path.join(cwd, config['postPath'])
+        self.repo_key = f"{config['login']}/{config['repo']}"
+        # 输出目标名称，同一知识库输出到多个目标时状态存储按目标区分
+        self.target = config.get('target') or ''
+        # 已同步文档的元数据(不含正文)
+        self.manifest = []
+        # 输出文件的变化，多个下载器同步时由SyncRunner替换为共用的清单
+        self.changes = ChangeSet()
+        # 本次同步中新占用的文件名 {路径: doc_id}，同名文档按doc_id决定归属
+        self.claimed = {}
+        self.search_index = None
+        self.toc_tree = None
+        
+        # 确保目录存在
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        os.makedirs(self.post_basic_path, exist_ok=True)
+        
+        # 目录过滤规则
+        filters = config.get('filters') or {}
+        self.include = filters.get('include') or []
+        self.exclude = filters.get('exclude') or []
+        
+        # 同步状态存储
+        self.owns_state = state is None
+        self.state = state or StateStore(os.path.join(cwd, config['statePath']))
+
+    def close(self):
+        """关闭自己打开的状态存储"""
+        if self.owns_state:
+            self.state.close()
+
+    @property
+    def name(self):
+        """知识库和输出目标，用于日志和统计"""
+        return f"{self.repo_key}[{self.target}]" if self.target else self.repo_key
+
+    def get_file_name(self, post):
+        """
+        根据配置获取文件名
+        
+        Args:
+            post: 文章信息字典
+            
+        Returns:
+            str: 文件名（不包含扩展名）
+        """
+        name_format = self.config.get('mdNameFormat', 'title')
+        slug = post.get('slug') or 'untitled'
+        
+        if name_format == 'title':
+            # 使用标题作为文件名
+            name = (post.get('title') or '').strip() or slug
+        elif name_format == 'slug':
+            # 使用 slug 作为文件名
+            name = slug
+        elif name_format == 'timestamp':
+            # 使用文档创建时间作为文件名，每次同步得到的文件名相同
+            name = f"{self.created_timestamp(post)}_{slug}"
+        else:
+            # 默认使用标题
+            name = post.get('title') or slug
+        return format_file_name(name) or format_file_name(slug) or 'untitled'
+
+    @staticmethod
+    def created_timestamp(post):
+        """文档创建时间的时间戳，没有创建时间时使用当前时间"""
+        try:
+            return int(datetime.fromisoformat(post['created_at'].replace('Z', '+00:00')).timestamp())
+        except (KeyError, AttributeError, ValueError):
+            return int(time.time())
+
+    def resolve_post_path(self, post):
+        """
+        确定文章的输出路径
+
+        状态存储中记录了 doc_id → 路径，文件名没有变化的文档总是写到原来的路径；
+        文件名已被其他文档占用时加上 doc_id 后缀，已占用的文档保持不变；
+        同一次同步中同时占用时 doc_id 小的优先，先写入的文档移到带后缀的文件名，与拉取完成的先后顺序无关，
+        因此同名文档不会互相覆盖，每次同步得到的路径也相同。
+
+        Returns:
+            tuple: (输出路径, 改名前的旧路径，没有改名时为None)
+        """
+        doc_id = str(post.get('id'))
+        name = self.get_file_name(post)
+        bare_path = os.path.join(self.post_basic_path, f"{name}.md")
+        suffixed_path = os.path.join(self.post_basic_path, f"{name}-{doc_id}.md")
+        known = self.state.get_doc(doc_id, self.target)
+        old_path = known['file'] if known else None
+        if old_path == suffixed_path:
+            post_path = suffixed_path
+        else:
+            owner = self.state.file_owner(bare_path, self.target)
+            if owner in (None, doc_id):
+                post_path = bare_path
+            elif self.claimed.get(bare_path) == owner and doc_id_order(doc_id) < doc_id_order(owner):
+                self.move_post(owner, os.path.join(self.post_basic_path, f"{name}-{owner}.md"))
+                post_path = bare_path
+            else:
+                post_path = suffixed_path
+        return post_path, old_path if old_path and old_path != post_path else None
+
+    def move_post(self, doc_id, new_path):
+        """把本次同步中已写入的文章移到新路径(让出文件名给doc_id更小的同名文档)"""
+        doc = self.state.get_doc(doc_id, self.target)
+        old_path = doc['file']
+        out.info(f"move post file: {old_path} -> {new_path}")
+        if os.path.exists(old_path):
+            os.replace(old_path, new_path)
+        self.state.upsert_doc(doc_id, doc['repo'], doc['slug'], doc['title'], new_path, doc['updated_at'],
+                              doc['hash'], self.target)
+        self.claimed.pop(old_path, None)
+        self.claimed[new_path] = doc_id
+        for entry in self.manifest:
+            if str(entry['id']) == doc_id:
+                entry['file'] = new_path
+        self.changes.record('added', new_path)
+
+    def accepts(self, path):
+        """
+        按目录路径过滤文档: include 不为空时只保留匹配的文档，exclude 匹配的文档总是排除
+
+        Args:
+            path: 文档的标题路径(包含文档本身)，匹配时用 / 连接，如 "技术/Python/入门"
+        """
+        if not self.include and not self.exclude:
+            return True
+        toc_path = '/'.join(path)
+        if self.include and not any(fnmatch.fnmatchcase(toc_path, pattern) for pattern in self.include):
+            return False
+        return not any(fnmatch.fnmatchcase(toc_path, pattern) for pattern in self.exclude)
+
+    def iter_docs(self, toc_tree):
+        """遍历目录树中需要同步的文档结点"""
+        for node, depth, path in toc_tree.iter_docs():
+            if self.accepts(path):
+                yield node, depth, path
+
+    def select_docs(self, toc_tree, doc=None, toc_path=None):
+        """
+        从目录树中选出指定的文档或目录下的所有文档
+
+        Args:
+            doc: 文档ID或slug
+            toc_path: 目录路径，如 "目录/子目录"，也可以是单篇文档的完整路径
+
+        Returns:
+            set: doc_id集合
+        """
+        parts = [part for part in (toc_path or '').strip('/').split('/') if part]
+        selected = set()
+        for node, depth, path in self.iter_docs(toc_tree):
+            if doc is not None and doc not in (str(node.doc_id), node.slug):
+                continue
+            if path[:len(parts)] != parts:
+                continue
+            selected.add(str(node.doc_id))
+        return selected
+
+    def fetch_article(self, item, toc_path):
+        """获取文档详情，返回文章数据"""
+        doc_resp = self.client.get_doc(item['doc_id'])
+        if not doc_resp or 'data' not in doc_resp:
+            return None
+        doc = doc_resp['data']
+        if not self.client.offline and 'id' in doc:
+            # 保存原始数据，修改适配器后可以离线重新生成
+            self.state.save_raw_doc(self.repo_key, doc)
+        
+        # 准备文档数据
+        article = {
+            'id': doc.get('id', item['doc_id']),
+            'title': doc.get('title', ''),
+            'slug': doc.get('slug', ''),
+            'created_at': doc.get('created_at', ''),
+            'updated_at': doc.get('updated_at', ''),
+            'published_at': doc.get('published_at', ''),
+            'body': doc.get('body', ''),
+            'path': os.path.join(*toc_path),  # 保存文档路径
+            'tags': toc_path[:-1]  # 使用父级目录作为标签
+        }
+        if use_img_cdn(self.config):
+            article['cdn_map'] = self.known_cdn_images(article['body'])
+        if self.client.offline:
+            article['local_images'] = self.known_local_images(article['body'])
+        return article
+
+    def known_local_images(self, body):
+        """状态存储中已保存到本地的图片，返回 {图片地址: 本地路径}"""
+        local_images = {}
+        for match in img_pattern.finditer(body or ''):
+            image = self.state.get_image(match.group(2))
+            if image and image['local_path'] and os.path.exists(image['local_path']):
+                local_images[image['url']] = image['local_path']
+        return local_images
+
+    def known_cdn_images(self, body):
+        """状态存储中已上传到图床的图片，返回 {图片地址: (CDN地址, 内容哈希)}"""
+        cdn_map = {}
+        for match in img_pattern.finditer(body or ''):
+            image = self.state.get_image(match.group(2))
+            if image and image['cdn_url']:
+                cdn_map[image['url']] = (image['cdn_url'], image['hash'])
+        return cdn_map
+
+    def update_tags_from_toc(self, toc_tree, doc_ids=None):
+        """
+        从TOC更新本输出目标已生成文档的标签
+
+        只处理状态存储中记录的属于本知识库、本输出目标的文件，按doc_id对应目录结点，
+        多个知识库输出到同一目录时不会改到其他知识库的同名文档。
+
+        Args:
+            toc_tree: 目录树
+            doc_ids: 需要更新的文档，为空时更新所有已生成的文档
+        """
+        if not self.front_matter_tags:
+            return
+        # doc_id到目录路径的映射(不包含文档本身的标题)
+        doc_paths = {str(node.doc_id): path[:-1] for node, depth, path in toc_tree.iter_docs()}
+        
+        # 更新已生成文档的标签
+        updated_count = 0
+        for doc_id, doc in self.state.get_docs(self.repo_key, self.target).items():
+            if doc_ids is not None and doc_id not in doc_ids:
+                continue
+            file_path = doc['file']
+            if doc_id not in doc_paths or not file_path or not os.path.exists(file_path):
+                continue
+            try:
+                # 读取markdown文件
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                
+                tags = doc_paths[doc_id]
+                new_content = set_front_matter_tags(content, tags)
+                if new_content != content:
+                    # 写回文件
+                    with open(file_path, 'w', encoding='utf-8') as f:
+                        f.write(new_content)
+                    self.changes.record('modified', file_path)
+                    
+                    updated_count += 1
+                    out.info(f"Updated tags for: {doc['title']}")
+                    out.info(f"New tags: {tags}")
+            
+            except Exception as e:
+                out.error(f"Failed to update tags for {os.path.basename(file_path)}: {str(e)}")
+        
+        out.info(f"Updated tags for {updated_count} documents")
+
+    def fetch_toc_tree(self):
+        """
+        获取目录树并保存TOC快照
+
+        Returns:
+            tuple: (目录树, 上一次的TOC快照)，TOC没有变化时快照为None；获取失败时返回 (None, None)
+        """
+        toc_data = self.client.get_toc()
+        if not toc_data or 'data' not in toc_data:
+            out.error(f"Failed to get TOC data: {self.repo_key}")
+            return None, None
+        previous_toc = self.state.latest_toc_snapshot(self.repo_key)
+        if self.state.save_toc_snapshot(self.repo_key, toc_data['data']):
+            out.info(f"TOC of {self.repo_key} changed since last sync, snapshot saved")
+        else:
+            previous_toc = None
+        toc_tree = build_toc_tree(toc_data['data'])
+        if toc_tree.orphan_count > 0:
+            out.warn(f"{toc_tree.orphan_count} TOC nodes have no parent, moved to root")
+        self.toc_tree = toc_tree
+        return toc_tree, previous_toc
+
+    def find_changed_docs(self, toc_tree, previous_toc, remote_docs):
+        """
+        对比状态存储，找出需要重新生成的文档和已删除的文档
+
+        Args:
+            toc_tree: 当前目录树
+            previous_toc: 上一次的TOC快照(没有变化时为None)
+            remote_docs: 文档列表接口返回的文档(含updated_at)，获取失败时为None
+
+        Returns:
+            tuple: (需要生成的doc_id集合, 已删除的doc_id集合)
+        """
+        known_docs = self.state.get_docs(self.repo_key, self.target)
+        # 上一次超过期限没有同步的文档
+        pending = self.state.get_pending_docs(self.repo_key, self.target)
+        remote_updated = {str(doc['id']): doc.get('updated_at') for doc in remote_docs or []}
+        previous_tree = build_toc_tree(previous_toc) if previous_toc else None
+        
+        changed = set()
+        current = set()
+        for node, depth, path in self.iter_docs(toc_tree):
+            doc_id = str(node.doc_id)
+            current.add(doc_id)
+            known = known_docs.get(doc_id)
+            if known is None or doc_id in pending or (known['file'] and not os.path.exists(known['file'])):
+                changed.add(doc_id)
+            elif remote_docs is not None and remote_updated.get(doc_id) != known['updated_at']:
+                changed.add(doc_id)
+            elif previous_tree is not None:
+                # 文档在目录中移动后标签会变化
+                previous_node = previous_tree.find_doc(doc_id)
+                if previous_node is None or previous_tree.parent_titles(previous_node) != path[:-1]:
+                    changed.add(doc_id)
+        deleted = (set(known_docs) | set(pending)) - current
+        return changed, deleted
+
+    def find_removed_docs(self, toc_tree):
+        """状态存储中有记录、但已不在目录中(或被过滤规则排除)的文档"""
+        current = {str(node.doc_id) for node, depth, path in self.iter_docs(toc_tree)}
+        known = set(self.state.get_docs(self.repo_key, self.target))
+        return (known | set(self.state.get_pending_docs(self.repo_key, self.target))) - current
+
+    def remove_doc(self, doc_id):
+        """删除已从知识库移除的文档"""
+        doc = self.state.get_doc(doc_id, self.target)
+        if doc and doc['file']:
+            if os.path.exists(doc['file']):
+                out.info(f"remove post file: {doc['file']}")
+                os.unlink(doc['file'])
+            self.changes.record('deleted', doc['file'])
+        self.state.delete_doc(doc_id, self.target)
+        self.state.remove_pending_doc(doc_id, self.target)
+        # 其他输出目标还保留该文档时不从检索索引中删除
+        if self.search_index and self.state.get_doc(doc_id) is None:
+            self.search_index.remove_doc(doc_id)
+
+    def load_toc_tree(self, refresh=False):
+        """获取目录树，默认使用上一次获取的结果"""
+        if self.toc_tree is None or refresh:
+            self.fetch_toc_tree()
+        return self.toc_tree
+
+    def sync_doc(self, doc_id, downloaders=None, batch=None):
+        """
+        同步单篇文档: 拉取 → 渲染 → 写入
+
+        Args:
+            downloaders: 同一知识库的所有输出目标，文档只拉取一次；为空时只输出到自己
+            batch: 适配器批次，见 generate_posts
+
+        Returns:
+            bool: 是否生成了文档
+        """
+        downloaders = downloaders or [self]
+        toc_tree = self.load_toc_tree()
+        node = toc_tree.find_doc(doc_id) if toc_tree else None
+        if node is None:
+            # 可能是新文档，重新获取目录
+            toc_tree = self.load_toc_tree(refresh=True)
+            node = toc_tree.find_doc(doc_id) if toc_tree else None
+        if node is None:
+            out.warn(f"doc {doc_id} is not in TOC, tags will be empty")
+            item, toc_path = {'doc_id': doc_id}, ['']
+        else:
+            item, toc_path = node.item, toc_tree.parent_titles(node) + [node.node_title]
+            downloaders = [downloader for downloader in downloaders if downloader.accepts(toc_path)]
+            if not downloaders:
+                out.info(f"doc {doc_id} is excluded by filters of {self.repo_key}")
+                return False
+        
+        article = fetch_post(downloaders, item, toc_path)
+        if not article:
+            out.error(f"Failed to fetch doc {doc_id}")
+            return False
+        generate_posts(downloaders, article, batch)
+        return True
+
+    @property
+    def front_matter_tags(self):
+        """本输出目标的适配器是否输出Hexo front matter的目录路径标签"""
+        return get_adapter(self.config['adapter'], self.config).front_matter_tags
+
+    def write_post(self, post, text):
+        """写入渲染后的文章"""
+        post_path, old_path = self.resolve_post_path(post)
+        # 在计算内容哈希前写入目录路径标签，之后不需要再改写文件
+        if post.get('path') and self.front_matter_tags:
+            try:
+                text = set_front_matter_tags(text, post.get('tags') or [])
+            except Exception as e:
+                out.error(f"Failed to update tags for {post.get('title')}: {str(e)}")
+        text_hash = content_hash(text)
+        
+        # 与上一次写入的路径和内容对比，没有变化的文章不算作变化，文件存在时也不重写
+        known = self.state.get_doc(post.get('id'), self.target)
+        if known is None or known['file'] != post_path:
+            change = 'added'
+        elif known['hash'] != text_hash:
+            change = 'modified'
+        else:
+            change = None
+        self.changes.record(change, post_path)
+        if change == 'added':
+            self.claimed[post_path] = str(post.get('id'))
+        
+        if change or not os.path.exists(post_path):
+            out.info(f"generate post file: {post_path}")
+            
+            # 确保目录存在
+            os.makedirs(os.path.dirname(post_path), exist_ok=True)
+            
+            # 写入文件
+            with open(post_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        else:
+            out.info(f"post file unchanged: {post_path}")
+        
+        # 只保留元数据，正文写入后即可释放
+        self.manifest.append({
+            'id': post.get('id'),
+            'slug': post.get('slug'),
+            'title': post.get('title'),
+            'updated_at': post.get('updated_at'),
+            'file': post_path,
+        })
+        
+        # 记录到状态存储
+        self.state.upsert_doc(post.get('id'), self.repo_key, post.get('slug'), post.get('title'), post_path,
+                              post.get('updated_at'), text_hash, self.target)
+        self.state.remove_pending_doc(post.get('id'), self.target)
+        # 文档改名后删除旧文件(没有被其他文档占用时)
+        if old_path and self.state.file_owner(old_path, self.target) is None:
+            if os.path.exists(old_path):
+                out.info(f"remove renamed post file: {old_path}")
+                os.unlink(old_path)
+            self.changes.record('deleted', old_path)
+        # 第一次出现或路径/CDN地址变化的图片
+        for img_url, img_path in post.get('image_map', {}).items():
+            image = self.state.get_image(img_url)
+            if image is None or image['local_path'] != img_path:
+                self.changes.record('images', img_path)
+            self.state.set_image(img_url, local_path=img_path)
+        for img_url, (cdn_url, image_hash) in post.get('cdn_map', {}).items():
+            image = self.state.get_image(img_url)
+            if image is None or image['cdn_url'] != cdn_url:
+                self.changes.record('images', cdn_url)
+            self.state.set_image(img_url, cdn_url=cdn_url, hash=image_hash)
+        
+        # 增量更新全文检索索引(内容没有变化的文档会跳过)
+        if self.search_index:
+            self.search_index.update_doc(post.get('id'), post.get('title'), '/'.join(post.get('tags') or []),
+                                         post.get('body', ''), post_path, post.get('updated_at'))
+
+    def export_toc_to_excel(self, toc_tree, output_path=None):
+        """导出TOC到Excel文件"""
+        if not output_path:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            output_path = f'yuque_toc_{timestamp}.xlsx'
+        
+        # 遍历TOC构建数据
+        rows = []
+        for node, depth, path in toc_tree.walk():
+            rows.append({
+                '层级': depth,
+                '类型': node.node_type or '',
+                '标题': node.node_title or '',
+                '文档ID': node.doc_id or '',
+                '路径': '/'.join(path)
+            })
+        
+        # 创建DataFrame
+        df = pd.DataFrame(rows)
+        
+        # 调整列顺序和名称
+        df = df[['层级', '类型', '标题', '文档ID', '路径']]
         
         # 写入Excel
         with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
@@ -738,6 +1825,539 @@ class Downloader:
         
         out.info(f"TOC exported to: {output_path}")
 
+def doc_id_order(doc_id):
+    """doc_id的排序键，与状态存储中 file_owner 的顺序一致(数字ID按数值)"""
+    return len(doc_id), doc_id
+
+# 输出文件变化清单
+class ChangeSet:
+    """
+    一次同步中输出文件的变化，由写入阶段记录
+
+    added/modified/deleted 为文章路径(与上一次写入的内容相同的文章只计入unchanged)，
+    images 为第一次保存或地址变化的本地图片路径/CDN地址；本地路径都相对于博客目录。
+    """
+    kinds = ('added', 'modified', 'deleted', 'images')
+
+    def __init__(self, command=None):
+        self.command = command
+        self.items = {kind: [] for kind in self.kinds}
+        self.unchanged = 0
+        self.lock = threading.Lock()
+
+    def record(self, kind, path):
+        """记录一项变化，kind为None时记为没有变化的文章"""
+        with self.lock:
+            if kind is None:
+                self.unchanged += 1
+                return
+            if '://' not in path:
+                path = os.path.relpath(path, cwd).replace(os.sep, '/')
+            if path not in self.items[kind]:
+                self.items[kind].append(path)
+            # 同一次同步中先删除后又写入的路径(例如文档改名后互换文件名)不算删除
+            if kind in ('added', 'modified') and path in self.items['deleted']:
+                self.items['deleted'].remove(path)
+                if kind == 'added':
+                    self.items['added'].remove(path)
+                    self.items['modified'].append(path)
+
+    @property
+    def empty(self):
+        return not any(self.items.values())
+
+    def counts(self):
+        return {kind: len(paths) for kind, paths in self.items.items()}
+
+    def to_dict(self):
+        return {'command': self.command, 'finished_at': datetime.now().isoformat(timespec='seconds'),
+                **self.items, 'unchanged': self.unchanged}
+
+def write_change_manifest(config, changes):
+    """把变化清单写入changesPath(JSON)，返回文件路径，没有配置时返回None"""
+    changes_path = config.get('changesPath')
+    if not changes_path:
+        return None
+    dist = os.path.join(cwd, changes_path)
+    tmp_path = f"{dist}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(changes.to_dict(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, dist)
+    counts = changes.counts()
+    out.info(f"changes: {counts['added']} added, {counts['modified']} modified, {counts['deleted']} deleted, "
+             f"{counts['images']} images, {changes.unchanged} unchanged")
+    return dist
+
+# 同步完成后执行的命令(例如 hexo generate)
+def run_post_sync_hook(config, changes):
+    """
+    输出文件有变化时执行postSyncHook，没有变化时跳过
+
+    变化清单(JSON)通过标准输入传给命令，清单文件路径在环境变量YUQUE_CHANGES中，
+    YUQUE_CHANGED/YUQUE_DELETED 为新增或修改、删除的文章数。
+    """
+    hook = config.get('postSyncHook')
+    if not hook:
+        return
+    if changes.empty:
+        out.info('no output changes, post sync hook skipped.')
+        return
+    out.info(f"run post sync hook: {hook}")
+    counts = changes.counts()
+    changes_path = config.get('changesPath')
+    env = {**os.environ, 'YUQUE_CHANGED': str(counts['added'] + counts['modified']),
+           'YUQUE_DELETED': str(counts['deleted']),
+           'YUQUE_CHANGES': os.path.join(cwd, changes_path) if changes_path else ''}
+    completed = subprocess.run(hook, shell=True, cwd=cwd, env=env, text=True,
+                               input=json.dumps(changes.to_dict(), ensure_ascii=False))
+    if completed.returncode != 0:
+        out.warn(f"post sync hook exited with code {completed.returncode}")
+
+# 展开多知识库配置
+def get_source_configs(config):
+    """
+    sources 中每一项是一个知识库(login、repo、filters 以及需要覆盖的其他配置)，
+    target 指向 targets 中的输出目标(postPath、adapter、mdNameFormat 等)，可以是列表，
+    同一知识库输出到多个目标时文档只拉取一次；没有配置 sources 时，顶层配置本身就是唯一的知识库。
+
+    Returns:
+        list: 每个知识库每个输出目标的完整配置
+    """
+    targets = config.get('targets') or {}
+    image_optimize = {**default_config['imageOptimize'], **(config.get('imageOptimize') or {})}
+    source_configs = []
+    for source in config.get('sources') or [{}]:
+        target_names = source.get('target', config.get('target'))
+        if not isinstance(target_names, list):
+            target_names = [target_names]
+        for target_name in target_names:
+            if target_name is not None and target_name not in targets:
+                out.error(f"target ({target_name}) is not defined in targets.")
+                exit(-1)
+            source_config = {**config, **targets.get(target_name, {}), **source, 'target': target_name or ''}
+            source_config.pop('sources', None)
+            source_config.pop('targets', None)
+            # 所有知识库共用图片目录，优化后的图片也只有一份，不能按输出目标设置
+            if {**default_config['imageOptimize'], **(source_config.get('imageOptimize') or {})} != image_optimize:
+                out.error(f"imageOptimize of target ({target_name}) differs from the top-level config, "
+                          f"set it at the top level only.")
+                exit(-1)
+            source_configs.append(source_config)
+    return source_configs
+
+def interleave(iterables):
+    """轮流从多个迭代器中取元素，直到全部取完"""
+    iterators = [iter(iterable) for iterable in iterables]
+    while iterators:
+        for iterator in list(iterators):
+            try:
+                yield next(iterator)
+            except StopIteration:
+                iterators.remove(iterator)
+
+# 多知识库同步
+class SyncRunner:
+    """
+    在一个进程中同步配置中的所有知识库
+
+    所有知识库共享客户端(连接池、限流器、用户信息)、状态存储、全文检索索引和图片目录；
+    各知识库的文档轮流进入同一条同步管道，单个知识库的慢请求不会让其他知识库空等。
+    同一知识库的多个输出目标组成一组，目录和文档只获取一次，渲染后分别写入各个目标。
+    """
+    def __init__(self, config):
+        self.config = config
+        self.state = StateStore(os.path.join(cwd, config['statePath']))
+        # 离线模式从状态存储读取TOC和文档，不访问语雀
+        self.offline = bool(config.get('offline'))
+        self.client = OfflineClient(config, self.state) if self.offline else YuqueClient(config)
+        self.search_index = None
+        # 最近一次同步的输出文件变化
+        self.changes = ChangeSet()
+        # 不经过同步管道生成的单篇文章(webhook、不在目录中的文档)共用的适配器批次，关闭时结束
+        self.adapter_batch = AdapterBatch()
+        # {知识库: {doc_id: updated_at}}，按更新时间排列拉取顺序
+        self.updated_times = {}
+        self.fresh_first = config.get('fetchOrder', 'updated') == 'updated'
+        self.downloaders = []
+        # {知识库: [各输出目标的下载器, ...]}
+        self.groups = {}
+        for source_config in get_source_configs(config):
+            repo_key = f"{source_config['login']}/{source_config['repo']}"
+            group = self.groups.setdefault(repo_key, [])
+            client = group[0].client if group else self.client.for_repo(source_config)
+            downloader = Downloader(source_config, client, self.state)
+            group.append(downloader)
+            self.downloaders.append(downloader)
+
+    def close(self):
+        """结束适配器批次，关闭检索索引和状态存储"""
+        self.adapter_batch.close()
+        self.close_search_index()
+        self.state.close()
+
+    @property
+    def repo_keys(self):
+        return list(self.groups)
+
+    def open_search_index(self):
+        """打开全文检索索引(searchIndexPath为空时不建索引)，所有知识库共用"""
+        index_path = self.config.get('searchIndexPath')
+        if index_path:
+            self.search_index = SearchIndex(os.path.join(cwd, index_path))
+        for downloader in self.downloaders:
+            downloader.search_index = self.search_index
+
+    def close_search_index(self):
+        if self.search_index:
+            self.search_index.close()
+            self.search_index = None
+        for downloader in self.downloaders:
+            downloader.search_index = None
+
+    def start_changes(self, command):
+        """开始记录本次同步的输出文件变化，所有下载器共用一个清单"""
+        self.changes = ChangeSet(command)
+        for downloader in self.downloaders:
+            downloader.changes = self.changes
+            downloader.claimed = {}
+
+    def finish_changes(self):
+        """写出变化清单，返回写入运行记录的变化数"""
+        write_change_manifest(self.config, self.changes)
+        return self.changes.counts()
+
+    def load_updated_times(self, group, remote_docs=None):
+        """记录知识库中文档的更新时间: 优先使用文档列表，其次是延后的文档和上一次同步的记录"""
+        repo_key = group[0].repo_key
+        times = {doc_id: doc['updated_at'] for doc_id, doc in self.state.get_docs(repo_key).items()}
+        times.update(self.state.get_pending_docs(repo_key))
+        times.update({str(doc['id']): doc.get('updated_at') for doc in remote_docs or []})
+        self.updated_times[repo_key] = times
+
+    def run_pipeline(self, doc_item_lists, stale_docs=None):
+        """
+        多个知识库的文档进入同一条同步管道: 默认按更新时间从新到旧拉取，fetchOrder为toc时各知识库交替
+
+        Args:
+            stale_docs: {知识库: 需要重新生成的doc_id集合}，全量同步时这些文档先拉取
+
+        Returns:
+            int: 超过拉取期限或数量上限、留到下一次同步的文档数(已是最新的文档不需要留到下一次)
+        """
+        if self.fresh_first:
+            doc_items = order_by_freshness([doc_item for doc_items in doc_item_lists for doc_item in doc_items],
+                                           self.updated_times, stale_docs)
+        else:
+            doc_items = interleave(doc_item_lists)
+        pipeline = SyncPipeline(self.config)
+        pipeline.run(doc_items)
+        deferred = [doc_item for doc_item in pipeline.deferred if is_stale(doc_item, stale_docs)]
+        for downloaders, item, path in deferred:
+            doc_id = str(item.get('doc_id'))
+            updated_at = self.updated_times.get(downloaders[0].repo_key, {}).get(doc_id)
+            for downloader in downloaders:
+                self.state.add_pending_doc(doc_id, downloader.repo_key, downloader.target, updated_at)
+        self.state.commit()
+        if deferred:
+            out.warn(f"{len(deferred)} docs deferred to next run")
+        return len(deferred)
+
+    def toc_excel_path(self, downloader):
+        """多个知识库时导出的Excel文件名带上知识库名称"""
+        if len(self.groups) == 1:
+            return None
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f"yuque_toc_{downloader.repo_key.replace('/', '_')}_{timestamp}.xlsx"
+
+    def prepare_group(self, group):
+        """校验适配器(避免在管道线程中退出)并清空上一次的同步记录"""
+        for downloader in group:
+            get_adapter(downloader.config['adapter'], downloader.config)
+            downloader.manifest = []
+
+    def fetch_group_toc(self, group):
+        """获取知识库的目录树，同组的下载器共用"""
+        toc_tree, previous_toc = group[0].fetch_toc_tree()
+        for downloader in group[1:]:
+            downloader.toc_tree = toc_tree
+        return toc_tree, previous_toc
+
+    def sync(self):
+        """全量同步所有知识库"""
+        run_id = self.state.start_run('offline' if self.offline else 'sync')
+        self.start_changes('offline' if self.offline else 'sync')
+        stats = {}
+        try:
+            trees = []
+            stale_docs = {}
+            for group in self.groups.values():
+                self.prepare_group(group)
+                toc_tree, _ = self.fetch_group_toc(group)
+                if toc_tree is not None:
+                    if self.fresh_first:
+                        # 新增、修改和上一次延后的文档先拉取，已是最新的文档最后拉取
+                        remote_docs = group[0].client.get_docs()
+                        self.load_updated_times(group, remote_docs)
+                        stale_docs[group[0].repo_key] = set().union(
+                            *(downloader.find_changed_docs(toc_tree, None, remote_docs)[0] for downloader in group))
+                    trees.append((group, toc_tree))
+            if not trees:
+                self.state.finish_run(run_id, 'failed', {'error': 'Failed to get TOC data'})
+                return
+            
+            # 遍历目录结构，下载文档，同时更新全文检索索引
+            self.open_search_index()
+            try:
+                deferred = self.run_pipeline((iter_group_docs(group, toc_tree) for group, toc_tree in trees),
+                                             stale_docs)
+                # 删除已从知识库中移除的文档
+                for group, toc_tree in trees:
+                    for downloader in group:
+                        for doc_id in downloader.find_removed_docs(toc_tree):
+                            downloader.remove_doc(doc_id)
+                if self.search_index:
+                    # 已移除的文档在上面删除时已从索引中删除，这里只清理状态存储中没有记录的文档；
+                    # 超过拉取期限或数量上限没有拉取、拉取失败的文档和获取TOC失败的知识库保留上一次的索引
+                    keep = set(self.state.get_docs())
+                    keep.update(str(doc['id']) for downloader in self.downloaders for doc in downloader.manifest)
+                    removed = self.search_index.remove_missing(keep)
+                    out.info(f"search index: {self.search_index.count()} docs, {removed} removed")
+            finally:
+                self.close_search_index()
+            
+            for group, toc_tree in trees:
+                for downloader in group:
+                    # 从TOC更新标签(本次生成的文章写入时已经设置，这里只更新没有拉取到的文档)
+                    downloader.update_tags_from_toc(toc_tree)
+                    stats[downloader.name] = len(downloader.manifest)
+                
+                # 导出TOC到Excel
+                group[0].export_toc_to_excel(toc_tree, self.toc_excel_path(group[0]))
+            
+            out.info('download articles done!')
+            status = 'done' if len(trees) == len(self.groups) and not deferred else 'partial'
+            self.state.finish_run(run_id, status, {'docs': sum(stats.values()), 'repos': stats, 'deferred': deferred,
+                                                   'changes': self.finish_changes()})
+        except Exception as e:
+            out.error(f"Auto update failed: {str(e)}")
+            self.state.finish_run(run_id, 'failed', {'repos': stats, 'error': str(e)})
+            raise
+
+    def plan_incremental(self, group):
+        """
+        获取目录和文档列表，找出各输出目标需要增量同步的文档
+
+        Returns:
+            tuple: (目录树, {下载器: (需要生成的doc_id集合, 已删除的doc_id集合)})，获取TOC失败时返回None
+        """
+        toc_tree, previous_toc = self.fetch_group_toc(group)
+        if toc_tree is None:
+            return None
+        remote_docs = group[0].client.get_docs()
+        self.load_updated_times(group, remote_docs)
+        return toc_tree, {downloader: downloader.find_changed_docs(toc_tree, previous_toc, remote_docs)
+                          for downloader in group}
+
+    def incremental_update(self):
+        """
+        增量更新所有知识库: 只生成新增、修改或在目录中移动过的文档，并删除已移除的文档
+
+        Returns:
+            dict: {'changed': 生成的文档数, 'deleted': 删除的文档数, 'deferred': 留到下一次的文档数}，
+                  所有知识库都获取TOC失败时返回None
+        """
+        run_id = self.state.start_run('watch')
+        self.start_changes('watch')
+        try:
+            plans = []
+            for group in self.groups.values():
+                for downloader in group:
+                    downloader.manifest = []
+                plan = self.plan_incremental(group)
+                if plan is not None:
+                    plans.append((group, *plan))
+            if not plans:
+                self.state.finish_run(run_id, 'failed', {'error': 'Failed to get TOC data'})
+                return None
+            
+            deleted_count = 0
+            deferred = 0
+            if any(changed or deleted for _, _, changes in plans for changed, deleted in changes.values()):
+                self.open_search_index()
+                try:
+                    for _, _, changes in plans:
+                        for downloader, (changed, deleted) in changes.items():
+                            for doc_id in deleted:
+                                downloader.remove_doc(doc_id)
+                            deleted_count += len(deleted)
+                            if changed:
+                                get_adapter(downloader.config['adapter'], downloader.config)
+                    deferred = self.run_pipeline(
+                        iter_group_docs(group, toc_tree, {downloader: changed for downloader, (changed, _)
+                                                          in changes.items()})
+                        for group, toc_tree, changes in plans)
+                finally:
+                    self.close_search_index()
+            
+            result = {'changed': sum(len(downloader.manifest) for downloader in self.downloaders),
+                      'deleted': deleted_count, 'deferred': deferred}
+            self.state.finish_run(run_id, 'partial' if deferred else 'done',
+                                  {**result, 'changes': self.finish_changes()})
+            return result
+        except Exception as e:
+            out.error(f"Incremental update failed: {str(e)}")
+            self.state.finish_run(run_id, 'failed', {'error': str(e)})
+            raise
+
+    def sync_selected(self, doc=None, toc_path=None):
+        """
+        只同步指定的文档或目录，其他已生成的文档保持不变
+
+        Returns:
+            int: 生成的文档数
+        """
+        run_id = self.state.start_run('offline' if self.offline else 'sync')
+        self.start_changes('offline' if self.offline else 'sync')
+        target = {'doc': doc, 'path': toc_path}
+        try:
+            plans = []
+            for group in self.groups.values():
+                self.prepare_group(group)
+                toc_tree, _ = self.fetch_group_toc(group)
+                if toc_tree is None:
+                    continue
+                selected = {downloader: downloader.select_docs(toc_tree, doc, toc_path) for downloader in group}
+                count = len(set().union(*selected.values()))
+                if count:
+                    out.info(f"{count} docs selected in {group[0].repo_key}")
+                    self.load_updated_times(group)
+                    plans.append((group, toc_tree, selected))
+            
+            deferred = 0
+            self.open_search_index()
+            try:
+                if plans:
+                    deferred = self.run_pipeline(iter_group_docs(group, toc_tree, selected)
+                                      for group, toc_tree, selected in plans)
+                elif doc is not None and toc_path is None:
+                    # 没有加入目录的文档直接按ID或slug获取
+                    self.sync_unlisted_doc(doc)
+                else:
+                    out.warn(f"no doc matches {target}")
+            finally:
+                self.close_search_index()
+            
+            count = sum(len(downloader.manifest) for downloader in self.downloaders)
+            self.state.finish_run(run_id, 'partial' if deferred else 'done',
+                                  {**target, 'docs': count, 'deferred': deferred, 'changes': self.finish_changes()})
+            return count
+        except Exception as e:
+            out.error(f"Sync failed: {str(e)}")
+            self.state.finish_run(run_id, 'failed', {**target, 'error': str(e)})
+            raise
+
+    def sync_unlisted_doc(self, doc):
+        """同步不在目录中的文档，依次在各知识库中查找"""
+        for repo_key, group in self.groups.items():
+            article = fetch_post(group, {'doc_id': doc}, [''])
+            if article:
+                out.warn(f"doc {doc} is not in TOC of {repo_key}, tags will be empty")
+                generate_posts(group, article, self.adapter_batch)
+                return True
+        out.warn(f"doc {doc} not found")
+        return False
+
+    def find_group(self, doc_id, repo_id=None):
+        """找到文档所属知识库的下载器组: 优先按事件中的知识库ID，其次按状态存储和目录"""
+        if len(self.groups) == 1:
+            return next(iter(self.groups.values()))
+        if repo_id:
+            for group in self.groups.values():
+                if str(group[0].client.get_repo_id()) == str(repo_id):
+                    return group
+        known = self.state.get_doc(doc_id)
+        if known and known['repo'] in self.groups:
+            return self.groups[known['repo']]
+        for group in self.groups.values():
+            toc_tree = group[0].load_toc_tree()
+            if toc_tree and toc_tree.find_doc(doc_id):
+                return group
+        return None
+
+    def handle_webhook_event(self, doc_id, action, repo_id=None):
+        """处理webhook事件: 删除事件删除文档，其他事件重新生成文档"""
+        group = self.find_group(doc_id, repo_id)
+        if group is None:
+            out.warn(f"webhook {action} doc {doc_id}: doc is not in any configured repo, ignored")
+            return
+        repo_key = group[0].repo_key
+        run_id = self.state.start_run('webhook')
+        self.start_changes('webhook')
+        for downloader in group:
+            downloader.manifest = []
+        self.open_search_index()
+        try:
+            if action == 'delete':
+                for downloader in group:
+                    downloader.remove_doc(doc_id)
+                result = {'changed': 0, 'deleted': 1}
+            else:
+                group[0].sync_doc(doc_id, group, self.adapter_batch)
+                result = {'changed': sum(len(downloader.manifest) for downloader in group), 'deleted': 0}
+            self.state.finish_run(run_id, 'done', {'doc_id': doc_id, 'repo': repo_key, 'action': action, **result,
+                                                   'changes': self.finish_changes()})
+        except Exception as e:
+            self.state.finish_run(run_id, 'failed', {'doc_id': doc_id, 'action': action, 'error': str(e)})
+            raise
+        finally:
+            self.close_search_index()
+        out.info(f"webhook {action} doc {doc_id} of {repo_key} done")
+        run_post_sync_hook(self.config, self.changes)
+
+# 监听模式
+class Watcher:
+    """
+    定时轮询TOC和文档列表，有变化时增量同步
+
+    客户端、连接和状态存储在整个运行期间保持；没有变化时轮询间隔按backoff倍数逐渐拉长，
+    直到maxInterval，一旦有变化恢复为minInterval。
+    """
+    def __init__(self, config):
+        self.config = config
+        watch_config = {**default_config['watch'], **config.get('watch', {})}
+        self.min_interval = watch_config['minInterval']
+        self.max_interval = max(self.min_interval, watch_config['maxInterval'])
+        self.backoff = max(1.0, watch_config['backoff'])
+        self.runner = SyncRunner(config)
+
+    def poll_once(self):
+        """执行一次增量同步，返回结果"""
+        result = self.runner.incremental_update()
+        if result and (result['changed'] or result['deleted']):
+            out.info(f"synced {result['changed']} changed, {result['deleted']} deleted docs")
+            run_post_sync_hook(self.config, self.runner.changes)
+        return result
+
+    def run(self):
+        interval = self.min_interval
+        out.info(f"watching {', '.join(self.runner.repo_keys)}, interval: {self.min_interval}s ~ {self.max_interval}s")
+        try:
+            while True:
+                try:
+                    result = self.poll_once()
+                except Exception:
+                    result = None
+                # 有延后的文档时尽快继续同步
+                if result and (result['changed'] or result['deleted'] or result['deferred']):
+                    interval = self.min_interval
+                else:
+                    interval = min(interval * self.backoff, self.max_interval)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            out.info('watch stopped.')
+        finally:
+            self.runner.close()
+
 # 清理工具
 class Cleaner:
     @staticmethod
@@ -748,6 +2368,15 @@ class Cleaner:
         out.info(f"remove yuque posts: {dist}")
         shutil.rmtree(dist, ignore_errors=True)
     
+    @staticmethod
+    def clean_all_posts(config):
+        """清理所有知识库输出的文章目录"""
+        post_paths = []
+        for source_config in get_source_configs(config):
+            if source_config['postPath'] not in post_paths:
+                post_paths.append(source_config['postPath'])
+                Cleaner.clean_posts(source_config)
+    
     @staticmethod
     def clean_images():
         """清理生成的文章目录"""
@@ -764,6 +2393,36 @@ class Cleaner:
         except Exception as e:
             out.warn(f"remove empty yuque.json: {str(e)}")
     
+    @staticmethod
+    def clear_state(config):
+        """清理同步状态存储"""
+        state_path = config.get('statePath')
+        if not state_path:
+            return
+        
+        dist = os.path.join(cwd, state_path)
+        out.info(f"remove state store: {dist}")
+        for path in (dist, f"{dist}-wal", f"{dist}-shm"):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    
+    @staticmethod
+    def clear_search_index(config):
+        """清理全文检索索引"""
+        index_path = config.get('searchIndexPath')
+        if not index_path:
+            return
+        
+        dist = os.path.join(cwd, index_path)
+        out.info(f"remove search index: {dist}")
+        for path in (dist, f"{dist}-wal", f"{dist}-shm"):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    
     @staticmethod
     def clear_last_generate(config):
         """清理上次生成的时间戳文件"""
@@ -779,37 +2438,138 @@ class Cleaner:
             pass
 
 # 命令行接口
-def sync_command():
-    """同步命令"""
+def sync_command(render_workers=None, doc=None, toc_path=None, offline=False, hook=None, deadline=None, budget=None):
+    """
+    同步命令，指定doc或toc_path时只同步对应的文档，offline时使用上一次同步保存的数据重新生成；
+    deadline/budget 限制本次拉取的时间和文档数，最近更新的文档先拉取
+    """
     config = load_config()
     if not config:
         exit(0)
     
-    # 如果没有设置lastGeneratePath，清理之前的目录
-    if config['lastGeneratePath'] == '':
-        out.info('clear previous directory.')
-        Cleaner.clean_posts(config)
+    if render_workers is not None:
+        config['renderWorkers'] = render_workers
+    if offline:
+        config['offline'] = True
+    if hook is not None:
+        config['postSyncHook'] = hook
+    if deadline is not None:
+        config['fetchDeadline'] = deadline
+    if budget is not None:
+        config['fetchBudget'] = budget
     
-    # 从语雀获取文章或缓存
-    downloader = Downloader(config)
-    downloader.auto_update()
+    runner = SyncRunner(config)
+    try:
+        if offline and not runner.state.raw_doc_count():
+            out.error('no cached docs in state store, run an online sync first.')
+            exit(-1)
+        
+        if doc is not None or toc_path is not None:
+            count = runner.sync_selected(doc, toc_path)
+            out.info(f'yuque-hexo sync done! {count} docs generated.')
+            run_post_sync_hook(config, runner.changes)
+            return
+        
+        # 如果没有设置lastGeneratePath，清理之前的目录(限制了拉取时间或数量时保留，没有拉取到的文档留在原处)
+        if config.get('fetchDeadline') or config.get('fetchBudget'):
+            out.info('keep previous directory: fetch deadline or budget is set.')
+        elif config['lastGeneratePath'] == '':
+            out.info('clear previous directory.')
+            Cleaner.clean_all_posts(config)
+        
+        # 从语雀获取文章或缓存
+        runner.sync()
+        run_post_sync_hook(config, runner.changes)
+    finally:
+        runner.close()
     out.info('yuque-hexo sync done!')
 
+def watch_command(min_interval=None, max_interval=None, hook=None):
+    """监听命令"""
+    config = load_config()
+    if not config:
+        exit(0)
+    
+    config['watch'] = {**default_config['watch'], **config.get('watch', {})}
+    if min_interval is not None:
+        config['watch']['minInterval'] = min_interval
+    if max_interval is not None:
+        config['watch']['maxInterval'] = max_interval
+    if hook is not None:
+        config['postSyncHook'] = hook
+    Watcher(config).run()
+
+def webhook_command(port=None, send_doc_id=None, action='update'):
+    """webhook命令: 启动接收服务，或向本地服务发送测试事件"""
+    config = load_config()
+    if not config:
+        exit(0)
+    
+    webhook_config = {**default_config['webhook'], **config.get('webhook', {})}
+    if port is not None:
+        webhook_config['port'] = port
+    
+    if send_doc_id is not None:
+        url = f"http://{webhook_config['host']}:{webhook_config['port']}{webhook_config['path']}"
+        if webhook_config['token']:
+            url += f"?token={webhook_config['token']}"
+        status, body = send_test_webhook(url, send_doc_id, action)
+        out.info(f"webhook response: {status} {body}")
+        return
+    
+    runner = SyncRunner(config)
+    for downloader in runner.downloaders:
+        get_adapter(downloader.config['adapter'], downloader.config)
+    server = WebhookServer(runner.handle_webhook_event, webhook_config['host'], webhook_config['port'],
+                           webhook_config['path'], webhook_config['token'], webhook_config['debounce'])
+    out.info(f"webhook server listening on {server.address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        out.info('webhook server stopped.')
+    finally:
+        runner.close()
+
 def clean_command():
     """清理命令"""
     config = load_config()
     if not config:
         exit(0)
     
-    Cleaner.clean_posts(config)
+    Cleaner.clean_all_posts(config)
     Cleaner.clean_images()
     Cleaner.clear_cache()
+    Cleaner.clear_state(config)
+    Cleaner.clear_search_index(config)
     Cleaner.clear_last_generate(config)
     out.info('yuque-hexo clean done!')
 
+def state_command(section='summary', limit=20):
+    """状态查看命令"""
+    config = load_config()
+    if not config:
+        exit(0)
+    
+    state_path = os.path.join(cwd, config['statePath'])
+    if not os.path.exists(state_path):
+        out.error('state store not found, run sync first.')
+        exit(-1)
+    run_state(state_path, section, limit)
+
+def search_command(query, limit=20):
+    """检索命令"""
+    config = load_config()
+    if not config:
+        exit(0)
+    
+    index_path = config.get('searchIndexPath')
+    if not index_path or not os.path.exists(os.path.join(cwd, index_path)):
+        out.error('search index not found, run sync first.')
+        exit(-1)
+    run_search(os.path.join(cwd, index_path), query, limit)
+
 def main():
     """主函数"""
-    import sys
     import argparse
     
     parser = argparse.ArgumentParser(description='yuque-hexo: A downloader for articles from yuque')
@@ -817,16 +2577,61 @@ def main():
     
     # sync命令
     sync_parser = subparsers.add_parser('sync', help='Sync articles from yuque')
+    sync_parser.add_argument('--render-workers', type=int, dest='render_workers',
+                             help='Number of processes used to render posts (0: render in main process)')
+    sync_parser.add_argument('--doc', help='Only sync the doc with this id or slug')
+    sync_parser.add_argument('--path', dest='toc_path', help='Only sync docs under this TOC path, e.g. "目录/子目录"')
+    sync_parser.add_argument('--offline', action='store_true',
+                             help='Re-render posts from docs and TOC saved by the last online sync, without network')
+    sync_parser.add_argument('--hook', help='Command to run if output files changed, e.g. "hexo generate"')
+    sync_parser.add_argument('--deadline', type=float,
+                             help='Stop fetching after this many seconds, the rest is synced next run')
+    sync_parser.add_argument('--budget', type=int, help='Max number of docs to fetch, the rest is synced next run')
+    
+    # watch命令
+    watch_parser = subparsers.add_parser('watch', help='Poll yuque and sync changed articles continuously')
+    watch_parser.add_argument('--interval', type=float, dest='min_interval', help='Min polling interval in seconds')
+    watch_parser.add_argument('--max-interval', type=float, dest='max_interval',
+                              help='Max polling interval in seconds when idle')
+    watch_parser.add_argument('--hook', help='Command to run after changes are synced, e.g. "hexo generate"')
+    
+    # webhook命令
+    webhook_parser = subparsers.add_parser('webhook', help='Receive yuque webhooks and sync single articles')
+    webhook_parser.add_argument('--port', type=int, help='Port to listen on')
+    webhook_parser.add_argument('--send', dest='send_doc_id', metavar='DOC_ID',
+                                help='Send a test webhook for DOC_ID to the local server instead of serving')
+    webhook_parser.add_argument('--action', default='update', choices=['publish', 'update', 'delete'],
+                                help='Action of the test webhook')
     
     # clean命令
     clean_parser = subparsers.add_parser('clean', help='Clean generated files')
     
+    # state命令
+    state_parser = subparsers.add_parser('state', help='Inspect the sync state store')
+    state_parser.add_argument('section', nargs='?', default='summary',
+                              choices=['summary', 'docs', 'images', 'pending', 'runs', 'toc'], help='What to show')
+    state_parser.add_argument('--limit', type=int, default=20, help='Max number of rows')
+    
+    # search命令
+    search_parser = subparsers.add_parser('search', help='Full-text search in synced articles')
+    search_parser.add_argument('query', help='Search keywords')
+    search_parser.add_argument('--limit', type=int, default=20, help='Max number of results')
+    
     args = parser.parse_args()
     
     if args.command == 'sync':
-        sync_command()
+        sync_command(render_workers=args.render_workers, doc=args.doc, toc_path=args.toc_path, offline=args.offline,
+                     hook=args.hook, deadline=args.deadline, budget=args.budget)
+    elif args.command == 'watch':
+        watch_command(args.min_interval, args.max_interval, args.hook)
+    elif args.command == 'webhook':
+        webhook_command(args.port, args.send_doc_id, args.action)
     elif args.command == 'clean':
         clean_command()
+    elif args.command == 'state':
+        state_command(args.section, args.limit)
+    elif args.command == 'search':
+        search_command(args.query, args.limit)
     else:
         parser.print_help()
 
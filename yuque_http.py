@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File     : yuque_http.py
+   Desc     : 可选的HTTP/2传输(httpx)，多个并发请求复用一个连接，服务端不支持时回退到HTTP/1.1
+-------------------------------------------------
+"""
+import threading
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def check_http2():
+    if httpx is None:
+        raise RuntimeError("HTTP/2 需要安装 httpx: pip install 'httpx[http2]'")
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        raise RuntimeError("HTTP/2 需要安装 h2: pip install 'httpx[http2]'")
+
+
+class Http2Session:
+    """
+    HTTP/2 会话，get/post/request 的用法与 requests.Session 相同
+
+    https 地址通过ALPN协商，服务端不支持HTTP/2时自动使用HTTP/1.1；prior_knowledge 为True时
+    http 地址也直接使用HTTP/2(h2c)。请求出现协议错误时切换到HTTP/1.1并重试，之后的请求都使用HTTP/1.1。
+
+    Args:
+        prior_knowledge: 不协商，直接使用HTTP/2
+        max_connections: 最大连接数，HTTP/2下同一主机的并发请求共用一个连接
+        on_fallback: 回退到HTTP/1.1时的回调，参数为异常
+    """
+    def __init__(self, prior_knowledge=False, max_connections=None, on_fallback=None):
+        check_http2()
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.client = httpx.Client(http2=True, http1=not prior_knowledge, follow_redirects=True, limits=self.limits)
+        self.on_fallback = on_fallback
+        self.fallback = False
+        self.http_version = None
+        self.lock = threading.Lock()
+
+    def _fall_back(self, client, error):
+        with self.lock:
+            if self.client is not client:
+                return
+            self.client = httpx.Client(follow_redirects=True, limits=self.limits)
+            self.fallback = True
+        client.close()
+        if self.on_fallback:
+            self.on_fallback(error)
+
+    def request(self, method, url, params=None, json=None, data=None, headers=None, timeout=None):
+        client = self.client
+        try:
+            response = client.request(method, url, params=params, json=json, content=data, headers=headers,
+                                      timeout=timeout)
+        except httpx.ProtocolError as e:
+            if client is self.client and self.fallback:
+                raise
+            self._fall_back(client, e)
+            response = self.client.request(method, url, params=params, json=json, content=data, headers=headers,
+                                           timeout=timeout)
+        # 最近一次请求实际使用的协议，如 HTTP/2、HTTP/1.1
+        self.http_version = response.http_version
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File     : yuque_image.py
+   Desc     : 图片优化: 限制尺寸、转换为WebP/压缩PNG、去掉EXIF，结果按源图片哈希缓存
+-------------------------------------------------
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# 默认优化参数
+default_options = {
+    'format': 'webp',
+    'quality': 80,
+    'maxWidth': 1920,
+    'maxHeight': 0,
+    'workers': 0,
+    'keepOriginal': False,
+}
+
+# 输出格式对应的 Pillow 格式名
+save_formats = {
+    'webp': 'WEBP',
+    'png': 'PNG',
+    'jpg': 'JPEG',
+}
+
+# 不处理的图片(动图、矢量图)
+skip_exts = ('gif', 'svg')
+
+
+def check_pillow():
+    if Image is None:
+        raise RuntimeError("图片优化需要安装 Pillow: pip install Pillow")
+
+
+def image_ext(path):
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    return 'jpg' if ext == 'jpeg' else ext
+
+
+def options_fingerprint(options):
+    """影响输出结果的参数，参数变化后缓存失效"""
+    keys = ('format', 'quality', 'maxWidth', 'maxHeight')
+    return json.dumps({key: options.get(key) for key in keys}, sort_keys=True)
+
+
+def _write_file(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def optimize_image(src_path, options):
+    """
+    优化单张图片，在子进程中执行
+
+    输出文件与源图片放在同一目录，按 源图片内容+优化参数 的哈希命名，已存在时直接返回(缓存命中)；
+    优化后没有变小时保存为原格式。
+
+    Returns:
+        str: 优化后的图片路径，不处理的图片返回源路径
+    """
+    src_ext = image_ext(src_path)
+    if src_ext in skip_exts:
+        return src_path
+    with open(src_path, 'rb') as f:
+        data = f.read()
+
+    options = {**default_options, **options}
+    target_ext = src_ext if options['format'] == 'keep' else options['format']
+    if target_ext not in save_formats:
+        target_ext = 'png'
+    digest = hashlib.sha256(options_fingerprint(options).encode('utf-8') + data).hexdigest()[:32]
+    dst_dir = os.path.dirname(src_path)
+    candidates = [os.path.join(dst_dir, f"{digest}.{ext}") for ext in dict.fromkeys((target_ext, src_ext))]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+
+    image = Image.open(io.BytesIO(data))
+    # 按EXIF方向旋转后再去掉EXIF
+    image = ImageOps.exif_transpose(image)
+    max_width = options['maxWidth'] or image.width
+    max_height = options['maxHeight'] or image.height
+    resized = image.width > max_width or image.height > max_height
+    if resized:
+        image.thumbnail((max_width, max_height), Image.LANCZOS)
+
+    if save_formats[target_ext] == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    if target_ext == 'png':
+        save_args = {'optimize': True}
+    elif target_ext == 'webp':
+        save_args = {'quality': options['quality'], 'method': 6}
+    else:
+        save_args = {'quality': options['quality'], 'optimize': True}
+    buffer = io.BytesIO()
+    image.save(buffer, save_formats[target_ext], **save_args)
+    output = buffer.getvalue()
+
+    if len(output) >= len(data) and not resized:
+        # 没有变小，保留原图内容，缓存同样生效
+        dst_path = candidates[-1]
+        output = data
+    else:
+        dst_path = candidates[0]
+    _write_file(dst_path, output)
+    return dst_path
+
+
+class ImageOptimizer:
+    """
+    多进程图片优化
+
+    同一张图片(路径、修改时间、大小都相同)只提交一次；优化结果按内容哈希缓存在磁盘上，
+    再次同步时不会重复处理。
+
+    Args:
+        options: imageOptimize 配置
+    """
+    def __init__(self, options):
+        check_pillow()
+        self.options = {**default_options, **options}
+        self.executor = ProcessPoolExecutor(max_workers=self.options['workers'] or None)
+        self.futures = {}
+        # 已被替换的源图片，关闭时删除(同步过程中其他文章可能还在引用)
+        self.replaced = set()
+        self.lock = threading.Lock()
+
+    def submit(self, src_path):
+        """提交图片，返回Future(结果为优化后的路径)"""
+        stat = os.stat(src_path)
+        key = (src_path, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            future = self.futures.get(key)
+            if future is None:
+                future = self.futures[key] = self.executor.submit(optimize_image, src_path, self.options)
+            return future
+
+    def result(self, src_path, future):
+        """
+        等待图片优化完成
+
+        Returns:
+            str: 优化后的路径
+        """
+        dst_path = future.result()
+        if dst_path != src_path:
+            with self.lock:
+                self.replaced.add(src_path)
+        return dst_path
+
+    def close(self):
+        """等待剩余任务完成，不保留原图时删除已被替换的源图片"""
+        self.executor.shutdown()
+        if self.options['keepOriginal']:
+            return
+        for src_path in self.replaced:
+            try:
+                os.remove(src_path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File     : yuque_search.py
+   Desc     : 本地全文检索索引(SQLite FTS5)，sync 时增量更新
+-------------------------------------------------
+"""
+import hashlib
+import re
+import sqlite3
+import time
+
+# 中日韩文字，按二元组切分后交给 unicode61 分词器
+cjk_pattern = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+')
+# 建索引前去掉的内容: 图片、链接地址、HTML标签
+noise_pattern = re.compile(r'!\[[^\]]*\]\([^)]*\)|\]\([^)]*\)|<[^>]+>|https?://\S+')
+token_pattern = re.compile(r'\w+')
+# 索引结构版本，切分方式变化时重建索引
+index_version = 1
+
+
+def segment_text(text, trailing_unigram=False):
+    """
+    切分文本: 连续的中日韩文字切成重叠的二元组(中文检索 → 中文 文检 检索)，其余文字保持不变
+
+    Args:
+        text: 原始文本
+        trailing_unigram: 是否在每段中日韩文字后面再加上最后一个字(建索引时使用)，
+            每个字都作为某个词的开头出现，单字前缀查询才能找到末尾的字
+
+    Returns:
+        str: 空格分隔的切分结果
+    """
+    def split_bigrams(match):
+        run = match.group(0)
+        if len(run) == 1:
+            return f" {run} "
+        tokens = [run[i:i + 2] for i in range(len(run) - 1)]
+        if trailing_unigram:
+            tokens.append(run[-1])
+        return " " + " ".join(tokens) + " "
+    return cjk_pattern.sub(split_bigrams, text or '')
+
+
+def build_match_query(query):
+    """
+    把用户输入转换为 FTS5 查询: 每个词切分后作为短语，多个词之间为 AND；
+    单个中文字符使用前缀匹配
+    """
+    phrases = []
+    for word in query.split():
+        tokens = token_pattern.findall(segment_text(word))
+        if not tokens:
+            continue
+        if len(tokens) == 1 and cjk_pattern.fullmatch(tokens[0]) and len(tokens[0]) == 1:
+            phrases.append(f'"{tokens[0]}"*')
+        else:
+            phrases.append('"' + " ".join(tokens) + '"')
+    return " AND ".join(phrases)
+
+
+class SearchIndex:
+    """
+    文档全文检索索引
+
+    docs 表保存文档元数据和内容哈希，docs_fts 保存切分后的标题、目录路径和正文；
+    内容哈希不变的文档不会重复建索引。
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                doc_id TEXT UNIQUE NOT NULL,
+                title TEXT,
+                toc_path TEXT,
+                file TEXT,
+                updated_at TEXT,
+                hash TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+                title, toc_path, body, tokenize='unicode61'
+            );
+        ''')
+        self._pending = 0
+        self.upgrade()
+
+    def upgrade(self):
+        """索引结构版本变化时清空全文索引，下一次同步时所有文档重新建索引"""
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= index_version:
+            return
+        self.conn.execute('DELETE FROM docs_fts')
+        self.conn.execute('UPDATE docs SET hash = NULL')
+        self.conn.execute(f'PRAGMA user_version = {index_version}')
+        self.conn.commit()
+
+    def update_doc(self, doc_id, title, toc_path, body, file_path=None, updated_at=None):
+        """
+        更新单篇文档的索引
+
+        Returns:
+            bool: 内容是否有变化(没有变化时不更新)
+        """
+        doc_id = str(doc_id)
+        content_hash = hashlib.sha1(f"{title}\0{toc_path}\0{body}".encode('utf-8')).hexdigest()
+        row = self.conn.execute('SELECT id, hash FROM docs WHERE doc_id = ?', (doc_id,)).fetchone()
+        if row and row[1] == content_hash:
+            self.conn.execute('UPDATE docs SET file = ?, updated_at = ? WHERE id = ?', (file_path, updated_at, row[0]))
+            return False
+
+        if row:
+            rowid = row[0]
+            self.conn.execute('UPDATE docs SET title = ?, toc_path = ?, file = ?, updated_at = ?, hash = ? WHERE id = ?',
+                              (title, toc_path, file_path, updated_at, content_hash, rowid))
+            self.conn.execute('DELETE FROM docs_fts WHERE rowid = ?', (rowid,))
+        else:
+            rowid = self.conn.execute('INSERT INTO docs (doc_id, title, toc_path, file, updated_at, hash) '
+                                      'VALUES (?, ?, ?, ?, ?, ?)',
+                                      (doc_id, title, toc_path, file_path, updated_at, content_hash)).lastrowid
+        self.conn.execute('INSERT INTO docs_fts (rowid, title, toc_path, body) VALUES (?, ?, ?, ?)',
+                          (rowid, segment_text(title, True), segment_text(toc_path, True),
+                           segment_text(noise_pattern.sub(' ', body or ''), True)))
+        self._pending += 1
+        # 批量提交，减少事务开销
+        if self._pending >= 200:
+            self.commit()
+        return True
+
+    def remove_doc(self, doc_id):
+        """删除单篇文档的索引"""
+        row = self.conn.execute('SELECT id FROM docs WHERE doc_id = ?', (str(doc_id),)).fetchone()
+        if row:
+            self.conn.execute('DELETE FROM docs_fts WHERE rowid = ?', (row[0],))
+            self.conn.execute('DELETE FROM docs WHERE id = ?', (row[0],))
+
+    def remove_missing(self, doc_ids):
+        """删除不在 doc_ids 中的文档(全量同步后调用)，返回删除数量"""
+        keep = {str(doc_id) for doc_id in doc_ids}
+        removed = [row for row in self.conn.execute('SELECT id, doc_id FROM docs') if row[1] not in keep]
+        for rowid, _ in removed:
+            self.conn.execute('DELETE FROM docs_fts WHERE rowid = ?', (rowid,))
+            self.conn.execute('DELETE FROM docs WHERE id = ?', (rowid,))
+        return len(removed)
+
+    def search(self, query, limit=20):
+        """
+        检索文档，按相关度排序(标题 > 目录路径 > 正文)
+
+        Returns:
+            list: [{'doc_id', 'title', 'toc_path', 'file', 'updated_at', 'score'}, ...]
+        """
+        match_query = build_match_query(query)
+        if not match_query:
+            return []
+        rows = self.conn.execute('''
+            SELECT docs.doc_id, docs.title, docs.toc_path, docs.file, docs.updated_at,
+                   bm25(docs_fts, 10.0, 5.0, 1.0) AS score
+            FROM docs_fts JOIN docs ON docs.id = docs_fts.rowid
+            WHERE docs_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+        ''', (match_query, limit)).fetchall()
+        keys = ('doc_id', 'title', 'toc_path', 'file', 'updated_at', 'score')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+def search_command(db_path, query, limit=20):
+    """命令行检索，返回结果数量"""
+    index = SearchIndex(db_path)
+    try:
+        start = time.perf_counter()
+        results = index.search(query, limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        for i, result in enumerate(results, 1):
+            toc_path = f" [{result['toc_path']}]" if result['toc_path'] else ''
+            print(f"{i:>3}. {result['title']}{toc_path}")
+            if result['file']:
+                print(f"     {result['file']}")
+        print(f"{len(results)} results in {elapsed:.1f}ms ({index.count()} docs indexed)")
+        return len(results)
+    finally:
+        index.close()
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File     : yuque_state.py
+   Desc     : 同步状态存储(SQLite)，保存文档元数据、TOC快照、图片映射和运行记录
+-------------------------------------------------
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+# 数据库结构迁移，按顺序执行，PRAGMA user_version 记录已执行到第几个
+migrations = [
+    # 1: 初始结构
+    '''
+    CREATE TABLE docs (
+        doc_id TEXT PRIMARY KEY,
+        repo TEXT,
+        slug TEXT,
+        title TEXT,
+        file TEXT,
+        updated_at TEXT,
+        hash TEXT,
+        synced_at TEXT
+    );
+    CREATE INDEX docs_repo ON docs (repo);
+    CREATE INDEX docs_file ON docs (file);
+    CREATE TABLE toc_snapshots (
+        id INTEGER PRIMARY KEY,
+        repo TEXT,
+        taken_at TEXT,
+        hash TEXT,
+        data TEXT
+    );
+    CREATE INDEX toc_snapshots_repo ON toc_snapshots (repo, id);
+    CREATE TABLE images (
+        url TEXT PRIMARY KEY,
+        local_path TEXT,
+        cdn_url TEXT,
+        hash TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE runs (
+        id INTEGER PRIMARY KEY,
+        command TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        status TEXT,
+        stats TEXT
+    );
+    ''',
+    # 2: 同一文档可以输出到多个目标，文档按 (doc_id, target) 区分
+    '''
+    CREATE TABLE docs_v2 (
+        doc_id TEXT NOT NULL,
+        target TEXT NOT NULL DEFAULT '',
+        repo TEXT,
+        slug TEXT,
+        title TEXT,
+        file TEXT,
+        updated_at TEXT,
+        hash TEXT,
+        synced_at TEXT,
+        PRIMARY KEY (doc_id, target)
+    );
+    INSERT INTO docs_v2 (doc_id, target, repo, slug, title, file, updated_at, hash, synced_at)
+        SELECT doc_id, '', repo, slug, title, file, updated_at, hash, synced_at FROM docs;
+    DROP TABLE docs;
+    ALTER TABLE docs_v2 RENAME TO docs;
+    CREATE INDEX docs_repo ON docs (repo, target);
+    CREATE INDEX docs_file ON docs (file);
+    ''',
+    # 3: 文档接口返回的原始数据(zlib压缩的JSON)，离线重新生成时使用
+    '''
+    CREATE TABLE raw_docs (
+        doc_id TEXT PRIMARY KEY,
+        repo TEXT,
+        slug TEXT,
+        updated_at TEXT,
+        data BLOB
+    );
+    CREATE INDEX raw_docs_repo ON raw_docs (repo, slug);
+    ''',
+    # 4: 超过拉取期限/数量没有同步的文档，留到下一次同步
+    '''
+    CREATE TABLE pending_docs (
+        doc_id TEXT NOT NULL,
+        target TEXT NOT NULL DEFAULT '',
+        repo TEXT,
+        updated_at TEXT,
+        deferred_at TEXT,
+        PRIMARY KEY (doc_id, target)
+    );
+    CREATE INDEX pending_docs_repo ON pending_docs (repo, target);
+    ''',
+]
+
+doc_fields = ('doc_id', 'target', 'repo', 'slug', 'title', 'file', 'updated_at', 'hash', 'synced_at')
+image_fields = ('url', 'local_path', 'cdn_url', 'hash', 'updated_at')
+run_fields = ('id', 'command', 'started_at', 'finished_at', 'status', 'stats')
+
+
+def now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def content_hash(text):
+    """计算文本内容哈希"""
+    return hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+
+
+class StateStore:
+    """
+    同步状态存储
+
+    使用WAL模式，写操作累积到一定数量后统一提交；
+    也可以用 transaction() 把一组写操作放在同一个事务里。
+    """
+    def __init__(self, db_path, batch_size=200):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._pending = 0
+        self._in_transaction = 0
+        self.migrate()
+
+    def migrate(self):
+        """执行未执行过的结构迁移"""
+        with self.lock:
+            version = self.schema_version()
+            for i in range(version, len(migrations)):
+                self.conn.executescript(migrations[i])
+                self.conn.execute(f'PRAGMA user_version = {i + 1}')
+                self.conn.commit()
+
+    def schema_version(self):
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def _written(self):
+        """记录一次写操作，不在事务中时按批次提交"""
+        self._pending += 1
+        if not self._in_transaction and self._pending >= self.batch_size:
+            self.commit()
+
+    @contextmanager
+    def transaction(self):
+        """批量写入，结束时统一提交"""
+        with self.lock:
+            self._in_transaction += 1
+            try:
+                yield self
+            finally:
+                self._in_transaction -= 1
+                if not self._in_transaction:
+                    self.commit()
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+            self._pending = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    # 文档
+    def upsert_doc(self, doc_id, repo=None, slug=None, title=None, file=None, updated_at=None, hash=None, target=''):
+        with self.lock:
+            self.conn.execute('''
+                INSERT INTO docs (doc_id, target, repo, slug, title, file, updated_at, hash, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (doc_id, target) DO UPDATE SET
+                    repo = excluded.repo, slug = excluded.slug, title = excluded.title, file = excluded.file,
+                    updated_at = excluded.updated_at, hash = excluded.hash, synced_at = excluded.synced_at
+            ''', (str(doc_id), target or '', repo, slug, title, file, updated_at, hash, now()))
+            self._written()
+
+    def get_doc(self, doc_id, target=None):
+        """获取文档元数据，target为None时返回任意一个目标的记录"""
+        sql = f"SELECT {', '.join(doc_fields)} FROM docs WHERE doc_id = ?"
+        params = (str(doc_id),)
+        if target is not None:
+            sql += ' AND target = ?'
+            params += (target,)
+        with self.lock:
+            row = self.conn.execute(sql, params).fetchone()
+        return dict(zip(doc_fields, row)) if row else None
+
+    def get_docs(self, repo=None, target=None):
+        """获取文档元数据，返回 {doc_id: 元数据}；不指定target时同一文档只保留一个目标的记录"""
+        sql = f"SELECT {', '.join(doc_fields)} FROM docs"
+        conditions = []
+        params = ()
+        if repo is not None:
+            conditions.append('repo = ?')
+            params += (repo,)
+        if target is not None:
+            conditions.append('target = ?')
+            params += (target,)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return {row[0]: dict(zip(doc_fields, row)) for row in rows}
+
+    def file_owner(self, file, target=''):
+        """占用该输出路径的文档ID，有多个时返回doc_id最小的，没有时返回None"""
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT doc_id FROM docs WHERE file = ? AND target = ?
+                ORDER BY length(doc_id), doc_id LIMIT 1
+            ''', (file, target or '')).fetchone()
+        return row[0] if row else None
+
+    def delete_doc(self, doc_id, target=None):
+        """删除文档记录，target为None时删除所有目标的记录"""
+        sql = 'DELETE FROM docs WHERE doc_id = ?'
+        params = (str(doc_id),)
+        if target is not None:
+            sql += ' AND target = ?'
+            params += (target,)
+        with self.lock:
+            self.conn.execute(sql, params)
+            self._written()
+
+    # 文档原始数据
+    def save_raw_doc(self, repo, doc):
+        """保存文档接口返回的原始数据"""
+        data = zlib.compress(json.dumps(doc, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        with self.lock:
+            self.conn.execute('''
+                INSERT INTO raw_docs (doc_id, repo, slug, updated_at, data) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (doc_id) DO UPDATE SET
+                    repo = excluded.repo, slug = excluded.slug, updated_at = excluded.updated_at, data = excluded.data
+            ''', (str(doc['id']), repo, doc.get('slug'), doc.get('updated_at'), data))
+            self._written()
+
+    def get_raw_doc(self, doc, repo=None):
+        """按doc_id或slug获取文档原始数据，没有时返回None"""
+        sql = 'SELECT data FROM raw_docs WHERE (doc_id = ? OR slug = ?)'
+        params = (str(doc), str(doc))
+        if repo is not None:
+            sql += ' AND repo = ?'
+            params += (repo,)
+        with self.lock:
+            row = self.conn.execute(sql + ' ORDER BY doc_id = ? DESC LIMIT 1', params + (str(doc),)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def raw_doc_count(self, repo=None):
+        with self.lock:
+            if repo is None:
+                return self.conn.execute('SELECT COUNT(*) FROM raw_docs').fetchone()[0]
+            return self.conn.execute('SELECT COUNT(*) FROM raw_docs WHERE repo = ?', (repo,)).fetchone()[0]
+
+    # 延后同步的文档
+    def add_pending_doc(self, doc_id, repo=None, target='', updated_at=None):
+        with self.lock:
+            self.conn.execute('''
+                INSERT INTO pending_docs (doc_id, target, repo, updated_at, deferred_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (doc_id, target) DO UPDATE SET
+                    repo = excluded.repo, updated_at = excluded.updated_at, deferred_at = excluded.deferred_at
+            ''', (str(doc_id), target or '', repo, updated_at, now()))
+            self._written()
+
+    def get_pending_docs(self, repo=None, target=None):
+        """获取延后同步的文档，返回 {doc_id: updated_at}"""
+        sql = 'SELECT doc_id, updated_at FROM pending_docs'
+        conditions = []
+        params = ()
+        if repo is not None:
+            conditions.append('repo = ?')
+            params += (repo,)
+        if target is not None:
+            conditions.append('target = ?')
+            params += (target,)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        with self.lock:
+            return dict(self.conn.execute(sql, params).fetchall())
+
+    def remove_pending_doc(self, doc_id, target=''):
+        with self.lock:
+            self.conn.execute('DELETE FROM pending_docs WHERE doc_id = ? AND target = ?', (str(doc_id), target or ''))
+            self._written()
+
+    # TOC快照
+    def save_toc_snapshot(self, repo, toc_list):
+        """
+        保存TOC快照，与最近一次快照相同时不保存
+
+        Returns:
+            bool: TOC是否有变化
+        """
+        data = json.dumps(toc_list, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        toc_hash = content_hash(data)
+        with self.lock:
+            row = self.conn.execute('SELECT hash FROM toc_snapshots WHERE repo = ? ORDER BY id DESC LIMIT 1',
+                                    (repo,)).fetchone()
+            if row and row[0] == toc_hash:
+                return False
+            self.conn.execute('INSERT INTO toc_snapshots (repo, taken_at, hash, data) VALUES (?, ?, ?, ?)',
+                              (repo, now(), toc_hash, data))
+            self._written()
+        return True
+
+    def latest_toc_snapshot(self, repo):
+        """获取最近一次的TOC快照，没有时返回None"""
+        with self.lock:
+            row = self.conn.execute('SELECT data FROM toc_snapshots WHERE repo = ? ORDER BY id DESC LIMIT 1',
+                                    (repo,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # 图片映射
+    def set_image(self, url, local_path=None, cdn_url=None, hash=None):
+        """记录图片URL对应的本地路径/CDN地址，为None的字段保持原值"""
+        with self.lock:
+            self.conn.execute('''
+                INSERT INTO images (url, local_path, cdn_url, hash, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    local_path = COALESCE(excluded.local_path, local_path),
+                    cdn_url = COALESCE(excluded.cdn_url, cdn_url),
+                    hash = COALESCE(excluded.hash, hash),
+                    updated_at = excluded.updated_at
+            ''', (url, local_path, cdn_url, hash, now()))
+            self._written()
+
+    def get_image(self, url):
+        with self.lock:
+            row = self.conn.execute(f"SELECT {', '.join(image_fields)} FROM images WHERE url = ?",
+                                    (url,)).fetchone()
+        return dict(zip(image_fields, row)) if row else None
+
+    # 运行记录
+    def start_run(self, command):
+        with self.lock:
+            run_id = self.conn.execute('INSERT INTO runs (command, started_at, status) VALUES (?, ?, ?)',
+                                       (command, now(), 'running')).lastrowid
+            self.conn.commit()
+        return run_id
+
+    def finish_run(self, run_id, status='done', stats=None):
+        with self.lock:
+            self.conn.execute('UPDATE runs SET finished_at = ?, status = ?, stats = ? WHERE id = ?',
+                              (now(), status, json.dumps(stats or {}, ensure_ascii=False), run_id))
+            self.commit()
+
+    def recent_runs(self, limit=10):
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {', '.join(run_fields)} FROM runs ORDER BY id DESC LIMIT ?",
+                                     (limit,)).fetchall()
+        return [dict(zip(run_fields, row)) for row in rows]
+
+    def summary(self):
+        """各表的记录数"""
+        with self.lock:
+            counts = {table: self.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                      for table in ('docs', 'raw_docs', 'pending_docs', 'toc_snapshots', 'images', 'runs')}
+        counts['schema_version'] = self.schema_version()
+        return counts
+
+
+def state_command(db_path, section='summary', limit=20):
+    """命令行查看状态存储"""
+    store = StateStore(db_path)
+    try:
+        if section == 'summary':
+            for key, value in store.summary().items():
+                print(f"{key:>16}: {value}")
+            runs = store.recent_runs(1)
+            if runs:
+                run = runs[0]
+                print(f"{'last run':>16}: {run['command']} {run['started_at']} → {run['finished_at']} {run['status']}")
+        elif section == 'docs':
+            with store.lock:
+                rows = store.conn.execute(f"SELECT {', '.join(doc_fields)} FROM docs ORDER BY updated_at DESC "
+                                          f"LIMIT ?", (limit,)).fetchall()
+            for doc in (dict(zip(doc_fields, row)) for row in rows):
+                target = f" [{doc['target']}]" if doc['target'] else ''
+                print(f"{doc['doc_id']:>10}  {doc['updated_at'] or '':<26} {doc['title']}{target}  →  {doc['file']}")
+        elif section == 'images':
+            with store.lock:
+                rows = store.conn.execute(f"SELECT {', '.join(image_fields)} FROM images ORDER BY updated_at DESC "
+                                          f"LIMIT ?", (limit,)).fetchall()
+            for row in rows:
+                image = dict(zip(image_fields, row))
+                print(f"{image['url']}\n    local: {image['local_path'] or '-'}  cdn: {image['cdn_url'] or '-'}")
+        elif section == 'runs':
+            for run in store.recent_runs(limit):
+                print(f"{run['id']:>5}  {run['command']:<8} {run['started_at']} → {run['finished_at'] or '-'}  "
+                      f"{run['status']}  {run['stats'] or ''}")
+        elif section == 'pending':
+            with store.lock:
+                rows = store.conn.execute('SELECT doc_id, target, repo, updated_at, deferred_at FROM pending_docs '
+                                          'ORDER BY updated_at DESC LIMIT ?', (limit,)).fetchall()
+            for doc_id, target, repo, updated_at, deferred_at in rows:
+                target = f" [{target}]" if target else ''
+                print(f"{doc_id:>10}  {updated_at or '':<26} {repo}{target}  deferred at {deferred_at}")
+        elif section == 'toc':
+            with store.lock:
+                rows = store.conn.execute('SELECT id, repo, taken_at, hash FROM toc_snapshots ORDER BY id DESC '
+                                          'LIMIT ?', (limit,)).fetchall()
+            for row in rows:
+                print(f"{row[0]:>5}  {row[1]}  {row[2]}  {row[3]}")
+    finally:
+        store.close()
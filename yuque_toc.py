@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python
+"""
+-------------------------------------------------
+   File     : yuque_toc.py
+   Desc     : 语雀知识库目录树(yuque_doc_backups 与 yuque_hexo 共用)
+-------------------------------------------------
+"""
+import os
+
+root_uuid = "root"
+root_title = "根目录"
+
+
+# 目录结点
+class TocNode:
+    __slots__ = ('node_type', 'node_title', 'node_uuid', 'parent_uuid', 'child_node_list',
+                 'doc_id', 'repo_id', 'repo_name', 'slug', 'item')
+
+    def __init__(self, node_type, node_title, node_uuid, parent_uuid, doc_id, repo_id, repo_name, slug=None,
+                 item=None):
+        self.node_type = node_type
+        self.node_title = node_title
+        self.node_uuid = node_uuid
+        self.parent_uuid = parent_uuid
+        self.child_node_list = []
+        self.doc_id = doc_id
+        self.repo_id = repo_id
+        self.repo_name = repo_name
+        self.slug = slug
+        # 原始TOC条目
+        self.item = item
+
+
+# 目录树
+class TocTree:
+    def __init__(self, root, nodes, orphan_count=0):
+        self.root = root
+        # {node_uuid: TocNode}, 包含根结点
+        self.nodes = nodes
+        # 父目录不存在、被挂到根目录下的结点数
+        self.orphan_count = orphan_count
+        self._doc_nodes = None
+
+    def __len__(self):
+        return len(self.nodes) - 1
+
+    def walk(self):
+        """
+        迭代深度优先遍历(先序)，不受递归深度限制
+
+        Yields:
+            tuple: (结点, 深度, 标题路径)，标题路径包含结点本身，不含根目录；
+                   路径列表在遍历过程中会被复用，需要保留时请复制
+        """
+        path = []
+        stack = [(node, 0) for node in reversed(self.root.child_node_list)]
+        while stack:
+            node, depth = stack.pop()
+            del path[depth:]
+            path.append(node.node_title or '')
+            yield node, depth, path
+            children = node.child_node_list
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], depth + 1))
+
+    def iter_docs(self, leaf_only=False):
+        """
+        遍历文档结点
+
+        Args:
+            leaf_only: 是否只返回没有子结点的文档
+        """
+        for node, depth, path in self.walk():
+            if node.node_type != "DOC" or not node.doc_id:
+                continue
+            if leaf_only and node.child_node_list:
+                continue
+            yield node, depth, path
+
+    def find_doc(self, doc_id):
+        """根据文档ID查找结点"""
+        if self._doc_nodes is None:
+            self._doc_nodes = {str(node.doc_id): node for node in self.nodes.values() if node.doc_id}
+        return self._doc_nodes.get(str(doc_id))
+
+    def parent_titles(self, node):
+        """获取结点从顶级目录开始的所有父级目录名称"""
+        titles = []
+        current = self.nodes.get(node.parent_uuid)
+        while current is not None and current is not self.root:
+            titles.append(current.node_title)
+            current = self.nodes.get(current.parent_uuid)
+        titles.reverse()
+        return titles
+
+
+# 根据语雀TOC接口返回的条目构建目录树
+def build_toc_tree(toc_list, repo_id=None, repo_name=None):
+    """
+    两遍构建: 第一遍创建所有结点，第二遍按原始顺序挂接父子关系，
+    因此不要求父目录出现在子结点之前。也兼容带 children 的嵌套条目。
+
+    Args:
+        toc_list: TOC条目列表
+        repo_id: 知识库ID
+        repo_name: 知识库名称
+
+    Returns:
+        TocTree: 目录树
+    """
+    root = TocNode(None, root_title, root_uuid, None, None, repo_id, repo_name)
+    nodes = {root_uuid: root}
+    ordered = []
+
+    # 第一遍: 创建结点(嵌套的children展开，父结点为所在条目)
+    pending = [(toc, None) for toc in reversed(toc_list or [])]
+    while pending:
+        toc, implied_parent = pending.pop()
+        node_uuid = toc.get('uuid') or "{}-{}".format(toc.get('type'), len(ordered))
+        parent_uuid = toc.get('parent_uuid') or implied_parent
+        node = TocNode(toc.get('type'), toc.get('title'), node_uuid, parent_uuid, toc.get('doc_id'), repo_id,
+                       repo_name, toc.get('slug') or toc.get('url'), toc)
+        nodes[node_uuid] = node
+        ordered.append(node)
+        for child in reversed(toc.get('children') or []):
+            pending.append((child, node_uuid))
+
+    # 第二遍: 挂接父子关系，找不到父目录时挂到根目录
+    orphan_count = 0
+    for node in ordered:
+        parent = nodes.get(node.parent_uuid) if node.parent_uuid else None
+        if parent is None or parent is node:
+            if node.parent_uuid:
+                orphan_count += 1
+            node.parent_uuid = root_uuid
+            parent = root
+        parent.child_node_list.append(node)
+    return TocTree(root, nodes, orphan_count)
+
+
+# 把标题中不能用于路径的字符替换掉
+def format_path_name(name):
+    return (name or '').replace("|", "_").replace("/", "、").replace('"', "'").replace(":", ";")
+
+
+# 拼接结点的保存路径(每一级标题都经过 format_path_name 处理)
+def join_toc_path(path, sep=os.sep):
+    return sep.join(format_path_name(title) for title in path)
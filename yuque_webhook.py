@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File     : yuque_webhook.py
+   Desc     : 语雀 webhook 接收服务，收到文档发布/更新/删除事件后只同步对应的文档
+-------------------------------------------------
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+
+def parse_webhook_payload(payload):
+    """
+    解析语雀 webhook 请求体
+
+    Returns:
+        tuple: (doc_id, 事件类型, 知识库ID)，不是文档事件时返回 (None, None, None)
+    """
+    data = payload.get('data') if isinstance(payload, dict) else None
+    if not isinstance(data, dict):
+        return None, None, None
+    action = data.get('action_type') or data.get('webhook_subject_type') or 'update'
+    # 评论事件的 data 是评论，文档在 commentable 中
+    if action.startswith('comment'):
+        return None, None, None
+    doc_id = data.get('id') or data.get('doc_id')
+    if not doc_id:
+        return None, None, None
+    book = data.get('book') if isinstance(data.get('book'), dict) else {}
+    repo_id = data.get('book_id') or book.get('id')
+    return str(doc_id), action, str(repo_id) if repo_id else None
+
+
+class DebounceQueue:
+    """
+    事件去抖队列: 同一文档在 delay 秒内的多次事件合并为一次，以最后一次事件类型为准；
+    停止时还在等待的事件立即处理，不会丢弃
+    """
+    def __init__(self, handler, delay=3.0):
+        self.handler = handler
+        self.delay = delay
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, doc_id, action, repo_id=None):
+        with self.condition:
+            self.pending[doc_id] = (action, repo_id, time.monotonic() + self.delay)
+            self.condition.notify()
+
+    def stop(self):
+        """停止接收，处理完还在等待的事件后返回"""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+
+    def _next_due(self):
+        """取出已到期的事件，没有时等待；停止后取出所有剩下的事件，没有剩下的事件时返回None"""
+        with self.condition:
+            while not self.stopped:
+                now = time.monotonic()
+                due = [(doc_id, action, repo_id) for doc_id, (action, repo_id, due_time) in self.pending.items()
+                       if due_time <= now]
+                if due:
+                    for doc_id, _, _ in due:
+                        del self.pending[doc_id]
+                    return due
+                timeout = min((due_time for _, _, due_time in self.pending.values()), default=now + 60) - now
+                self.condition.wait(max(timeout, 0.01))
+            due = [(doc_id, action, repo_id) for doc_id, (action, repo_id, _)
+                   in sorted(self.pending.items(), key=lambda entry: entry[1][2])]
+            self.pending.clear()
+            return due or None
+
+    def _run(self):
+        while True:
+            due = self._next_due()
+            if due is None:
+                return
+            for doc_id, action, repo_id in due:
+                try:
+                    self.handler(doc_id, action, repo_id)
+                except Exception as e:
+                    print(f"webhook handler failed for doc {doc_id}: {str(e)}")
+
+
+class WebhookServer:
+    """
+    webhook 接收服务
+
+    Args:
+        handler: 处理函数 handler(doc_id, action, repo_id)，在单独的线程中依次执行
+        token: 不为空时要求请求地址带上 ?token=xxx
+    """
+    def __init__(self, handler, host='127.0.0.1', port=8930, path='/yuque/webhook', token='', debounce=3.0):
+        self.path = path
+        self.token = token
+        self.queue = DebounceQueue(handler, debounce)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                server.handle_request(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def handle_request(self, request):
+        url = urlparse(request.path)
+        if url.path != self.path:
+            return self._respond(request, 404, {'ok': False, 'error': 'not found'})
+        if self.token and parse_qs(url.query).get('token', [''])[0] != self.token:
+            return self._respond(request, 403, {'ok': False, 'error': 'invalid token'})
+        try:
+            length = int(request.headers.get('Content-Length') or 0)
+            payload = json.loads(request.rfile.read(length) or b'{}')
+        except (ValueError, json.JSONDecodeError):
+            return self._respond(request, 400, {'ok': False, 'error': 'invalid json'})
+
+        doc_id, action, repo_id = parse_webhook_payload(payload)
+        if doc_id is None:
+            return self._respond(request, 200, {'ok': True, 'ignored': True})
+        self.queue.put(doc_id, action, repo_id)
+        self._respond(request, 200, {'ok': True, 'doc_id': doc_id, 'action': action})
+
+    @staticmethod
+    def _respond(request, status, body):
+        data = json.dumps(body).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def serve_forever(self):
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.httpd.server_close()
+        self.queue.stop()
+
+
+def send_test_webhook(url, doc_id, action='update', slug=None, title=None, repo_id=None):
+    """本地模拟语雀发送 webhook，返回响应内容"""
+    payload = {'data': {'id': doc_id, 'slug': slug, 'title': title, 'action_type': action, 'book_id': repo_id}}
+    response = requests.post(url, json=payload, timeout=10)
+    return response.status_code, response.json()